@@ -13,34 +13,33 @@ CONFIG_PATH = Path(__file__).parent / 'configs' / 'configs.yaml'
 
 
 def daily_main():
-    arxiv_flow = ArxivFlow(CONFIG_PATH)
     zhihu_flow = ZhihuFlow(CONFIG_PATH)
-    return arxiv_flow.default_routine(zhihu_instance=zhihu_flow)
+    with ArxivFlow(CONFIG_PATH) as arxiv_flow:
+        return arxiv_flow.default_routine(zhihu_instance=zhihu_flow)
 
 
 def selected_arxiv_ids(arxiv_ids, field, description):
-    arxiv_flow = ArxivFlow(CONFIG_PATH)
     zhihu_flow = ZhihuFlow(CONFIG_PATH)
-    return arxiv_flow.diy_routine(id_list=arxiv_ids, field=field,
-                                  zhihu_instance=zhihu_flow, bulk_description=description)
+    with ArxivFlow(CONFIG_PATH) as arxiv_flow:
+        return arxiv_flow.diy_routine(id_list=arxiv_ids, field=field,
+                                      zhihu_instance=zhihu_flow, bulk_description=description)
 
 
 def selected_query_option_arxiv(query_args_option, startTS, endTS):
-    arxiv_flow = ArxivFlow(CONFIG_PATH)
     zhihu_flow = ZhihuFlow(CONFIG_PATH)
-    return arxiv_flow.diy_routine(query_args_option=query_args_option, time_duration=[startTS, endTS],
-                                  zhihu_instance=zhihu_flow)
+    with ArxivFlow(CONFIG_PATH) as arxiv_flow:
+        return arxiv_flow.diy_routine(query_args_option=query_args_option, time_duration=[startTS, endTS],
+                                      zhihu_instance=zhihu_flow)
 
 
 def selected_query_arxiv(field, query_str, startTS, endTS):
-    arxiv_flow = ArxivFlow(CONFIG_PATH)
     zhihu_flow = ZhihuFlow(CONFIG_PATH)
-    return arxiv_flow.diy_routine(queries=query_str, time_duration=[startTS, endTS],
-                                  zhihu_instance=zhihu_flow, field=field)
+    with ArxivFlow(CONFIG_PATH) as arxiv_flow:
+        return arxiv_flow.diy_routine(queries=query_str, time_duration=[startTS, endTS],
+                                      zhihu_instance=zhihu_flow, field=field)
 
 
 def selected_topics(topic_name, max_post_count=100):
-    arxiv_flow = ArxivFlow(CONFIG_PATH)
     zhihu_flow = ZhihuFlow(CONFIG_PATH)
     arxiv_ids = zhihu_flow.search_topic_arxivs(topic_name, max_post_count=max_post_count)
     # arxiv_ids = ['2312.05162', '2312.04931', '2312.04817', '2312.03700', '2312.03668', '2312.03632', '2312.03628', '2312.03594', '2312.03025', '2312.03011', '2312.02980', '2312.02554', '2312.02520', '2312.02515', '2312.02433', '2312.02310', '2312.02252', '2312.02228', '2311.13627', '2311.13601']
@@ -49,8 +48,9 @@ def selected_topics(topic_name, max_post_count=100):
     if not arxiv_ids:
         logger.success("No related arxiv_ids retrieved.")
         return
-    return arxiv_flow.diy_routine(id_list=arxiv_ids, field=topic_name,
-                                  zhihu_instance=zhihu_flow, bulk_description=f'知乎上关于{topic_name}的论文')
+    with ArxivFlow(CONFIG_PATH) as arxiv_flow:
+        return arxiv_flow.diy_routine(id_list=arxiv_ids, field=topic_name,
+                                      zhihu_instance=zhihu_flow, bulk_description=f'知乎上关于{topic_name}的论文')
 
 
 def debug_method():
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+from pathlib import Path
+from urllib.parse import urlencode
+
+import arxiv
+import feedparser
+from loguru import logger
+
+from .arxiv_downloader import ResumableDownloader
+from .arxiv_rate_limiter import HostRateLimiter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncArxivBackend:
+    """
+    asyncio retrieval backend. One event loop runs in a daemon thread and owns a pooled aiohttp session, so search
+    paging, id lookups and PDF fetches from every download thread share its connections.
+    The sync entries results(search) and fetch(url, target_path) have the same signature as arxiv.Client.results
+    and ResumableDownloader.fetch, so the backend can be dropped into the existing retrieval path.
+    Every request takes a slot of the shared HostRateLimiter, the same rate policy as the sync path.
+    Search pages are parsed with arxiv.Search._url_args and arxiv.Result._from_feed_entry, private APIs of the
+    arxiv package, whose version is pinned in requirements.txt for that reason.
+    """
+
+    def __init__(self, rate_limiter: HostRateLimiter = None, max_concurrency=4, page_size=50, num_retries=3,
+                 connect_timeout=10, read_timeout=60, chunk_size=64 * 1024, total_timeout=300):
+        if aiohttp is None:
+            raise ImportError("aiohttp package not found, please install it with `pip install aiohttp`")
+        self.rate_limiter = rate_limiter if rate_limiter else HostRateLimiter()
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.page_size = page_size
+        self.num_retries = num_retries
+        self.chunk_size = chunk_size
+        # Seconds one PDF fetch attempt may take, see ResumableDownloader.
+        self.total_timeout = total_timeout
+        self.__timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever, name='arxiv-async-backend', daemon=True)
+        self.__thread.start()
+        self.__session = None
+        self.__semaphore = None
+        self.run(self.__open())
+
+    async def __open(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_concurrency)
+        self.__session = aiohttp.ClientSession(connector=connector, timeout=self.__timeout)
+        self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def run(self, coro):
+        """
+        Run coro on the backend loop and block the calling thread until it is done.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop).result()
+
+    def close(self):
+        if self.__session is not None:
+            self.run(self.__session.close())
+            self.__session = None
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join(timeout=10)
+
+    async def __wait_slot(self, url):
+        wait_seconds = self.rate_limiter.reserve(url)
+        if wait_seconds > 0:
+            await asyncio.sleep(wait_seconds)
+
+    def format_url(self, search: arxiv.Search, start, page_size):
+        url_args = search._url_args()
+        url_args.update({'start': start, 'max_results': page_size})
+        return arxiv.Client.query_url_format.format(urlencode(url_args))
+
+    async def fetch_page(self, search: arxiv.Search, start, page_size=None):
+        """
+        :return: (list of arxiv.Result, total result count)
+        """
+        url = self.format_url(search, start, page_size or self.page_size)
+        last_exception = None
+        for try_index in range(self.num_retries + 1):
+            try:
+                async with self.__semaphore:
+                    await self.__wait_slot(url)
+                    async with self.__session.get(url) as response:
+                        response.raise_for_status()
+                        text = await response.text()
+                feed = feedparser.parse(text)
+                # arXiv sometimes returns an empty page in the middle of a result set, retry like arxiv.Client.
+                if not feed.entries and start > 0:
+                    raise arxiv.UnexpectedEmptyPageError(url, try_index, feed)
+                total = int(feed.feed.get('opensearch_totalresults', 0) or 0)
+                result_list = []
+                for entry in feed.entries:
+                    try:
+                        result_list.append(arxiv.Result._from_feed_entry(entry))
+                    except arxiv.Result.MissingFieldError as e:
+                        logger.warning(f"Skipping partial result: {str(e)}")
+                return result_list, total
+            except (aiohttp.ClientError, asyncio.TimeoutError, arxiv.UnexpectedEmptyPageError) as e:
+                last_exception = e
+                logger.debug(f"Page request failed (try {try_index}): {url} {str(e)}")
+        raise last_exception
+
+    def results(self, search: arxiv.Search, offset=0):
+        """
+        Sync generator over search results. The next page is requested while the current one is consumed.
+        """
+        limit = search.max_results - offset if search.max_results else None
+        if limit is not None and limit <= 0:
+            return
+        result_list, total = self.run(self.fetch_page(search, offset))
+        logger.info(f"Got first page: {len(result_list)} of {total} total results")
+        yielded_count = 0
+        pending_page = None
+        try:
+            while result_list:
+                offset += len(result_list)
+                pending_page = asyncio.run_coroutine_threadsafe(self.fetch_page(search, offset), self.__loop) \
+                    if offset < total else None
+                for result_instance in result_list:
+                    yield result_instance
+                    yielded_count += 1
+                    if limit is not None and yielded_count >= limit:
+                        return
+                if pending_page is None:
+                    break
+                result_list, _ = pending_page.result()
+                pending_page = None
+        finally:
+            if pending_page is not None:
+                pending_page.cancel()
+
+    async def fetch_pdf(self, url, target_path):
+        """
+        Range resumable PDF fetch, the request, status handling and verification are the ones of
+        ResumableDownloader.
+        """
+        target_path = Path(target_path)
+        part_path, resume_from, headers = ResumableDownloader.prepare_resume(url, target_path)
+        async with self.__semaphore:
+            await self.__wait_slot(url)
+            deadline = ResumableDownloader.get_deadline(self.total_timeout)
+            async with self.__session.get(url, headers=headers) as response:
+                if response.status not in (200, 206, 416):
+                    response.raise_for_status()
+                write_mode, expected_size = ResumableDownloader.get_write_plan(url, response.status,
+                                                                               response.headers, resume_from)
+                if write_mode:
+                    with open(part_path, write_mode) as f:
+                        async for chunk in response.content.iter_chunked(self.chunk_size):
+                            f.write(chunk)
+                            ResumableDownloader.check_deadline(url, deadline)
+
+        return ResumableDownloader.finalize(part_path, target_path, expected_size)
+
+    def fetch(self, url, target_path):
+        return self.run(self.fetch_pdf(url, target_path))
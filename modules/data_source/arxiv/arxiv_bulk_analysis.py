@@ -2,11 +2,14 @@ import os
 import traceback
 import shutil
 import zipfile
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from modules.models import Paper
 from langchain.schema import Document
 from .arxiv_paper_parser import PaperParser
 from .arxiv_paper_retriever import PaperRetriever
+from .arxiv_parse_stage import ParseStage
 from modules.xmind_related import fix_xmind
 from langchain.prompts import PromptTemplate
 import arxiv
@@ -31,11 +34,22 @@ from XmindCopilot.XmindCopilot.file_shrink import xmind_shrink
 
 class BulkAnalysis:
     def __init__(self, llm_engine, db_instance, paper_parser_instance: PaperParser,
-                 paper_retriever_instance: PaperRetriever):
+                 paper_retriever_instance: PaperRetriever, parse_workers=None, llm_max_concurrency=1):
+        """
+        :param parse_workers: Processes of the PDF parse stage, defaults to the cpu count.
+        :param llm_max_concurrency: Papers summarized at the same time, i.e. in-flight requests to the LLM provider.
+        """
         self.llm_engine = llm_engine
+        self.llm_max_concurrency = max(1, int(llm_max_concurrency or 1))
         self.__paper_parser = paper_parser_instance
         self.__paper_retriever = paper_retriever_instance
         self.__db_instance = db_instance
+        self.__parse_stage = ParseStage(max_workers=parse_workers)
+        # Entry ids in the report of the last main call
+        self.last_processed_entry_ids = []
+
+    def close(self):
+        self.__parse_stage.close()
 
     @staticmethod
     def reformat_string(string_input, row_max=35):
@@ -77,12 +91,31 @@ Output:
         return res
 
     def load_bulk_papers(self, papers: List[Paper], field=None):
-        documents = []
-        for paper in papers:
+        """
+        Summarize papers concurrently, at most llm_max_concurrency at a time. The steps of one paper stay sequential,
+        documents are returned in the order of papers. Everything read from the PDFs is loaded on the calling thread
+        first, the workers never touch PyMuPDF.
+        """
+        def _summarize(paper):
             paper_sum = self.__paper_parser.summarize_single_paper(paper_instance=paper, field=field)
-            document_instance = Document(page_content=paper_sum, metadata={'title': paper.title, 'source': paper.url})
-            documents.append(document_instance)
-        return documents
+            return Document(page_content=paper_sum, metadata={'title': paper.title, 'source': paper.url})
+
+        def _summarize_in_worker(paper):
+            try:
+                return _summarize(paper)
+            finally:
+                # 工作线程的Session用完即关闭
+                if self.__db_instance:
+                    self.__db_instance.remove_session()
+
+        if self.llm_max_concurrency == 1 or len(papers) <= 1:
+            return [_summarize(paper) for paper in papers]
+        # PyMuPDF不支持多线程: PDF内容先在主线程读取, 工作线程只使用提取好的文本
+        for paper in papers:
+            paper.load_summary_text(with_sections=self.__paper_parser.needs_paper_text(paper, field))
+        logger.info(f"Summarize {len(papers)} papers with concurrency {self.llm_max_concurrency}.")
+        with ThreadPoolExecutor(max_workers=min(self.llm_max_concurrency, len(papers))) as executor:
+            return list(executor.map(_summarize_in_worker, papers))
 
     def refine_analyze_bulk_paper(self, papers: List[Paper], field=None):
         logger.info("Starts to do refine analysis.")
@@ -218,59 +251,132 @@ Output:
                 paper_description += f'{key.upper()}: {description_dict[key]}\n'
         return paper_description
 
-    def main(self, download_history_path: Path, zhihu_instance=None):
+    def is_summarized(self, task):
+        return bool(self.__db_instance and self.__db_instance.get_whole_summary_chinese(task['entry_id']))
+
+    def parse_papers(self, tasks):
+        """
+        Parse PDFs on the process pool and build lazy Paper objects on the parsed artifacts.
+        :param tasks: List of {'entry_id', 'pdf_path', 'title', 'checksum'}
+        :return: (dict of entry_id -> Paper, list of tasks whose PDF could not be parsed)
+        """
+        papers_dict = {}
+        broken_tasks = []
+        # 已有中文总结的论文不再解析, 需要时由Paper按需读取
+        parse_results = self.__parse_stage(tasks, skip=self.is_summarized)
+        for task in tasks:
+            parse_res = parse_results.get(task['entry_id'], {})
+            if parse_res.get('status') != 'ok':
+                logger.warning(f"paper: {task['entry_id']} {parse_res.get('error')}")
+                broken_tasks.append(task)
+                continue
+            try:
+                papers_dict[task['entry_id']] = Paper(path=task['pdf_path'], url=task['entry_id'], title=task['title'],
+                                                      checksum=parse_res['checksum'])
+            except Exception as e:
+                logger.warning(str(e))
+                logger.debug(traceback.format_exc())
+                broken_tasks.append(task)
+        return papers_dict, broken_tasks
+
+    def main(self, download_history_path: Path, zhihu_instance=None, paper_pool: dict = None):
+        """
+        :param download_history_path:
+        :param zhihu_instance:
+        :param paper_pool: Optional run-level dict of entry_id -> Paper shared by several batches, so a paper
+        that belongs to several fields is only parsed once.
+        :return:
+        """
+        self.last_processed_entry_ids = []
         with open(download_history_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         paper_data = data.get('download_history', {})
-        bulk_description_data = {i: data[i] for i in data.keys() if i != 'download_history'}
-        papers = []
+        bulk_description_data = {i: data[i] for i in data.keys()
+                                 if i != 'download_history' and i not in PaperRetriever.HISTORY_STATUS_KEYS}
+        papers_dict = {}
+        tasks = []
         for i in paper_data.keys():
+            if paper_pool is not None and i in paper_pool:
+                logger.info(f"Reuse parsed paper: {i}")
+                papers_dict[i] = paper_pool[i]
+                continue
             try:
-                title = eval(paper_data[i]["info"]).get("title")
-                try:
-                    paper_ins = Paper(path=paper_data[i]['downloaded_pdf_path'], url=i, title=title)
-                except Exception as e:
-                    logger.warning(str(e))
-                    logger.debug(traceback.format_exc())
-                    logger.warning(f"Will remove :{paper_data[i]['downloaded_pdf_path']}")
-                    if Path(paper_data[i]['downloaded_pdf_path']).exists():
-                        os.remove(paper_data[i]['downloaded_pdf_path'])
-                    res = self.__paper_retriever.download_by_arxiv_id([i.split('/')[-1]])
-                    title = res[i.split('/')[-1]][1].title
-                    paper_ins = Paper(path=res[i.split('/')[-1]][0], url=i, title=title)
-                papers.append(paper_ins)
+                tasks.append({'entry_id': i,
+                              'pdf_path': paper_data[i]['downloaded_pdf_path'],
+                              'title': eval(paper_data[i]["info"]).get("title"),
+                              'checksum': paper_data[i].get('sha256')})
             except Exception as e:
                 logger.error(f'paper: {i}')
                 logger.error(e)
                 logger.debug(traceback.format_exc())
                 continue
 
-        # REFINE SUMMARY
-        summary = None
-        if papers:
-            try:
-                res = self.refine_analyze_bulk_paper(papers, bulk_description_data.get("field", None))
-                summary = self.bulk_translation_universal(res)
-            except Exception as e:
-                logger.warning(str(e))
-                logger.debug(traceback.format_exc())
-                summary = '暂无总结'
-            logger.success(f"SUMMARY: \n {summary}")
-
-        paper_description_str = self.generate_paper_description(bulk_description_data)
-        logger.info(
-            f"Try to analyze bulk paper with count {len(papers)}. \n[Bulk description]: \n{paper_description_str}")
-        batch_path = download_history_path.parent
-        workbook_path = self.generate_paper_xmind(papers=papers,
-                                                  papers_description=paper_description_str,
-                                                  summary=summary,
-                                                  batch_path=batch_path,
-                                                  field=bulk_description_data.get("field", None),
-                                                  zhihu_instance=zhihu_instance)
+        # Cached summaries of the batch are read in one query and written back together, already summarized
+        # papers are not parsed again.
+        summary_batch = self.__db_instance.summary_batch(list(paper_data.keys())) \
+            if self.__db_instance else nullcontext()
+        with summary_batch:
+            parsed_papers, broken_tasks = self.parse_papers(tasks)
+            papers_dict.update(parsed_papers)
+            broken_ids = []
+            for task in broken_tasks:
+                logger.warning(f"Will remove :{task['pdf_path']}")
+                if Path(task['pdf_path']).exists():
+                    os.remove(task['pdf_path'])
+                self.__paper_retriever.pdf_store.remove(task['entry_id'])
+                broken_ids.append(task['entry_id'])
+
+            # Broken PDFs are refetched together in one batched id lookup.
+            if broken_ids:
+                logger.info(f"Try to recover {len(broken_ids)} broken papers.")
+                try:
+                    res = self.__paper_retriever.download_by_arxiv_id([i.split('/')[-1] for i in broken_ids])
+                except Exception as e:
+                    logger.error(f"Recovery failed: {str(e)}")
+                    logger.debug(traceback.format_exc())
+                    res = {}
+                recover_tasks = []
+                for i in broken_ids:
+                    if i.split('/')[-1] not in res:
+                        logger.error(f'paper: {i} not recovered.')
+                        continue
+                    downloaded_path, res_ins = res[i.split('/')[-1]]
+                    recover_tasks.append({'entry_id': i, 'pdf_path': downloaded_path, 'title': res_ins.title,
+                                          'checksum': None})
+                recovered_papers, _ = self.parse_papers(recover_tasks)
+                papers_dict.update(recovered_papers)
+
+            papers = [papers_dict[i] for i in paper_data.keys() if i in papers_dict]
+            if paper_pool is not None:
+                paper_pool.update(papers_dict)
+
+            # REFINE SUMMARY
+            summary = None
+            if papers:
+                try:
+                    res = self.refine_analyze_bulk_paper(papers, bulk_description_data.get("field", None))
+                    summary = self.bulk_translation_universal(res)
+                except Exception as e:
+                    logger.warning(str(e))
+                    logger.debug(traceback.format_exc())
+                    summary = '暂无总结'
+                logger.success(f"SUMMARY: \n {summary}")
+
+            paper_description_str = self.generate_paper_description(bulk_description_data)
+            logger.info(
+                f"Try to analyze bulk paper with count {len(papers)}. \n[Bulk description]: \n{paper_description_str}")
+            batch_path = download_history_path.parent
+            workbook_path = self.generate_paper_xmind(papers=papers,
+                                                      papers_description=paper_description_str,
+                                                      summary=summary,
+                                                      batch_path=batch_path,
+                                                      field=bulk_description_data.get("field", None),
+                                                      zhihu_instance=zhihu_instance)
         if not workbook_path:
             logger.warning("No results. Removed batch")
             shutil.rmtree(batch_path)
             return None
+        self.last_processed_entry_ids = [paper.url for paper in papers]
         logger.info(f"Starts to shrink workbook: {workbook_path}")
         current_size = os.path.getsize(workbook_path)
         for quality in range(10, 0, -1):
@@ -303,7 +409,8 @@ Output:
         with open(download_history_path, 'r') as f:
             data = json.load(f)
         paper_data = data.get('download_history', {})
-        bulk_description_data = {i: data[i] for i in data.keys() if i != 'download_history'}
+        bulk_description_data = {i: data[i] for i in data.keys()
+                                 if i != 'download_history' and i not in PaperRetriever.HISTORY_STATUS_KEYS}
         papers = []
         for i in paper_data.keys():
             try:
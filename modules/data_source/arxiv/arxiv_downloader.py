@@ -0,0 +1,164 @@
+import os
+import re
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+
+from .arxiv_rate_limiter import HostRateLimiter
+
+
+class DownloadVerificationException(Exception):
+    pass
+
+
+class DownloadTimeoutException(Exception):
+    pass
+
+
+class ResumableDownloader:
+    """
+    PDF downloader that writes to <target>.part and resumes an interrupted transfer with an HTTP Range request
+    instead of starting over. One requests.Session keeps connections alive across downloads.
+    The url is taken as is, so the downloader can be pointed at a local HTTP stand-in server.
+    """
+
+    def __init__(self, rate_limiter: HostRateLimiter = None, session: requests.Session = None,
+                 timeout=(10, 60), chunk_size=64 * 1024, max_pool_size=8, total_timeout=300):
+        """
+        :param rate_limiter: Shared per-host limiter, every request (including resumes) takes a slot.
+        :param session:
+        :param timeout: (connect, read) timeout of a single request, a stalled read raises and the part is kept.
+        :param chunk_size:
+        :param max_pool_size: Kept-alive connections per host, should match the download pool size.
+        :param total_timeout: Seconds one attempt may take in total, a slow but never stalled transfer is stopped
+        after it and the part is kept for the next attempt.
+        """
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.chunk_size = chunk_size
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_pool_size, pool_maxsize=max_pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    @staticmethod
+    def get_part_path(target_path):
+        return Path(str(target_path) + '.part')
+
+    @staticmethod
+    def parse_content_range(content_range):
+        """
+        'bytes 100-199/200' -> (100, 200), 'bytes */200' -> (None, 200)
+        """
+        match = re.match(r'bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)', content_range or '')
+        if not match:
+            return None, None
+        start = int(match.group(1)) if match.group(1) is not None else None
+        total = int(match.group(2)) if match.group(2) != '*' else None
+        return start, total
+
+    @staticmethod
+    def verify(pdf_path, expected_size=None):
+        size = os.path.getsize(pdf_path)
+        if expected_size is not None and size != expected_size:
+            raise DownloadVerificationException(f"Size mismatch {size}/{expected_size}: {pdf_path}")
+        with open(pdf_path, 'rb') as f:
+            head = f.read(5)
+            f.seek(max(0, size - 2048))
+            tail = f.read()
+        if head != b'%PDF-' or b'%%EOF' not in tail:
+            raise DownloadVerificationException(f"Not a complete PDF: {pdf_path}")
+
+    @staticmethod
+    def get_deadline(total_timeout):
+        return time.monotonic() + total_timeout if total_timeout else None
+
+    @staticmethod
+    def check_deadline(url, deadline):
+        if deadline is not None and time.monotonic() > deadline:
+            raise DownloadTimeoutException(f"Download attempt exceeded its deadline: {url}")
+
+    @classmethod
+    def prepare_resume(cls, url, target_path):
+        """
+        Request side of a fetch, shared with AsyncArxivBackend.fetch_pdf.
+        :return: (part_path, resume_from, request headers)
+        """
+        part_path = cls.get_part_path(target_path)
+        os.makedirs(Path(target_path).parent, exist_ok=True)
+        resume_from = os.path.getsize(part_path) if part_path.exists() else 0
+        # Range offsets must refer to the raw bytes.
+        headers = {'Accept-Encoding': 'identity'}
+        if resume_from:
+            headers['Range'] = f'bytes={resume_from}-'
+            logger.info(f"Resume {url} from byte {resume_from}")
+        return part_path, resume_from, headers
+
+    @classmethod
+    def get_write_plan(cls, url, status, headers, resume_from):
+        """
+        How to write the body of a response with status 200, 206 or 416.
+        :param headers: Response headers.
+        :return: (write mode of the part file, None if there is nothing to write, expected total size)
+        """
+        if status == 416:
+            # Nothing left to fetch, the part file may already be complete.
+            _, expected_size = cls.parse_content_range(headers.get('Content-Range'))
+            return None, expected_size
+        if status == 206:
+            range_start, expected_size = cls.parse_content_range(headers.get('Content-Range'))
+            if range_start != resume_from:
+                raise DownloadVerificationException(f"Unexpected range start {range_start}: {url}")
+            return 'ab', expected_size
+        if status == 200:
+            # Range not honored, start over.
+            content_length = headers.get('Content-Length')
+            return 'wb', int(content_length) if content_length else None
+        raise DownloadVerificationException(f"Unexpected status {status}: {url}")
+
+    @classmethod
+    def finalize(cls, part_path, target_path, expected_size=None):
+        """
+        Verify the part file and move it to target_path.
+        :return: str of target_path
+        """
+        try:
+            cls.verify(part_path, expected_size)
+        except DownloadVerificationException:
+            # A complete but corrupted transfer cannot be resumed.
+            if expected_size is None or os.path.getsize(part_path) >= expected_size:
+                os.remove(part_path)
+            raise
+        os.replace(part_path, target_path)
+        return str(target_path)
+
+    def fetch(self, url, target_path):
+        """
+        Download url to target_path, resuming from <target_path>.part if a previous attempt left one.
+        :return: str of target_path
+        """
+        target_path = Path(target_path)
+        part_path, resume_from, headers = self.prepare_resume(url, target_path)
+        if self.rate_limiter:
+            self.rate_limiter.wait(url)
+        deadline = self.get_deadline(self.total_timeout)
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code not in (200, 206, 416):
+                response.raise_for_status()
+            write_mode, expected_size = self.get_write_plan(url, response.status_code, response.headers,
+                                                            resume_from)
+            if write_mode:
+                with open(part_path, write_mode) as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                        self.check_deadline(url, deadline)
+
+        return self.finalize(part_path, target_path, expected_size)
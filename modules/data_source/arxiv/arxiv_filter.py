@@ -0,0 +1,90 @@
+import re
+from itertools import islice
+
+from loguru import logger
+
+
+class ResultFilter:
+    """
+    Client-side predicates of retrieve_topic_w_regex.
+    Regexes are compiled once, categories are matched against a set, and results are evaluated page by page one
+    predicate at a time, so every predicate only sees the results the previous ones kept.
+    Reject counts per predicate are kept in self.reject_counts.
+    """
+
+    def __init__(self, summary_regex=None, title_regex=None, journal_ref_regex=None,
+                 target_subject_category=None, target_primary_category=None, batch_size=50):
+        """
+        :param target_subject_category: Every target must be one of the categories of the result. An archive
+        without subject class (e.g. cs) matches all of its categories (cs.AI, cs.CL, ...).
+        :param target_primary_category: Same rule applied to the primary category.
+        :param batch_size: Results evaluated together, one API page by default.
+        """
+        self.batch_size = max(1, int(batch_size))
+        self.predicates = []
+        if summary_regex:
+            self.predicates.append(('summary_regex', self.regex_predicate(summary_regex, 'summary')))
+        if title_regex:
+            self.predicates.append(('title_regex', self.regex_predicate(title_regex, 'title')))
+        if journal_ref_regex:
+            self.predicates.append(('journal_ref_regex', self.regex_predicate(journal_ref_regex, 'journal_ref')))
+        if target_subject_category:
+            self.predicates.append(('target_subject_category',
+                                    self.category_predicate(target_subject_category, lambda x: x.categories)))
+        if target_primary_category:
+            self.predicates.append(('target_primary_category',
+                                    self.category_predicate(target_primary_category, lambda x: [x.primary_category])))
+        self.reject_counts = {name: 0 for name, _ in self.predicates}
+        self.seen_count = 0
+
+    @staticmethod
+    def regex_predicate(pattern, attr_name):
+        compiled_pattern = re.compile(pattern)
+
+        def _predicate(x):
+            return compiled_pattern.search(getattr(x, attr_name) or '') is not None
+
+        return _predicate
+
+    @staticmethod
+    def category_predicate(targets, get_categories):
+        if isinstance(targets, str):
+            targets = [targets]
+        exact_targets = frozenset(i for i in targets if '.' in i)
+        archive_targets = frozenset(i for i in targets if '.' not in i)
+
+        def _predicate(x):
+            categories = set(get_categories(x))
+            if not exact_targets <= categories:
+                return False
+            if archive_targets:
+                # cs.AI -> cs, math-ph stays math-ph
+                archives = {i.split('.')[0] for i in categories}
+                if not archive_targets <= archives:
+                    return False
+            return True
+
+        return _predicate
+
+    def filter_batch(self, batch):
+        self.seen_count += len(batch)
+        for name, predicate in self.predicates:
+            kept = [x for x in batch if predicate(x)]
+            self.reject_counts[name] += len(batch) - len(kept)
+            batch = kept
+            if not batch:
+                break
+        return batch
+
+    def __call__(self, results):
+        """
+        :param results: Iterable of arxiv.Result.
+        :return: Generator of the results passing every predicate, in input order.
+        """
+        results = iter(results)
+        while True:
+            batch = list(islice(results, self.batch_size))
+            if not batch:
+                break
+            yield from self.filter_batch(batch)
+        logger.info(f"Filter stats: {self.seen_count} seen, rejected by {self.reject_counts}")
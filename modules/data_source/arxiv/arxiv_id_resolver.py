@@ -0,0 +1,114 @@
+import re
+import threading
+from datetime import timedelta
+
+import arxiv
+from loguru import logger
+
+from .arxiv_metadata_cache import ArxivMetadataCache
+
+
+class ArxivIdResolver:
+    """
+    Resolve arxiv ids to arxiv.Result with as few API calls as possible.
+    Ids are looked up in the metadata cache first, the rest are sent as id_list in chunks of batch_size over one
+    shared arxiv.Client. A chunk rejected by the API (e.g. one malformed id) is split in halves until the bad id
+    is isolated, so one typo does not lose the whole batch.
+    """
+
+    def __init__(self, metadata_cache: ArxivMetadataCache = None, batch_size=100, delay_seconds=3.0,
+                 versionless_max_age: timedelta = timedelta(hours=48)):
+        """
+        :param metadata_cache: Optional persistent cache, results resolved here are written back to it.
+        :param batch_size: Ids per API request, the request URL grows with it.
+        :param delay_seconds:
+        :param versionless_max_age: An id without version resolves to the latest version, which may change, so its
+        cached resolution expires after this.
+        """
+        self.metadata_cache = metadata_cache
+        self.batch_size = max(1, int(batch_size))
+        self.versionless_max_age = versionless_max_age
+        self.client = arxiv.Client(page_size=self.batch_size, delay_seconds=delay_seconds, num_retries=5)
+        self.__client_lock = threading.Lock()
+        self.__memo = {}
+
+    @staticmethod
+    def normalize_id(arxiv_id: str):
+        """
+        http://arxiv.org/abs/2310.12345v2 -> 2310.12345v2, arXiv:2310.12345 -> 2310.12345
+        """
+        arxiv_id = arxiv_id.strip().split('arxiv.org/abs/')[-1].split('arxiv.org/pdf/')[-1]
+        arxiv_id = re.sub(r'^arxiv:', '', arxiv_id, flags=re.IGNORECASE)
+        return re.sub(r'\.pdf$', '', arxiv_id)
+
+    @staticmethod
+    def has_version(arxiv_id: str):
+        return re.search(r'v\d+$', arxiv_id) is not None
+
+    @classmethod
+    def match_requested_id(cls, result_instance: arxiv.Result, requested_ids):
+        short_id = result_instance.get_short_id()
+        if short_id in requested_ids:
+            return short_id
+        versionless_id = re.sub(r'v\d+$', '', short_id)
+        if versionless_id in requested_ids:
+            return versionless_id
+        return None
+
+    def __lookup_cache(self, arxiv_ids):
+        res = {i: self.__memo[i] for i in arxiv_ids if i in self.__memo}
+        missing_ids = [i for i in arxiv_ids if i not in res]
+        if not self.metadata_cache or not missing_ids:
+            return res
+        aliases = self.metadata_cache.get_id_aliases([i for i in missing_ids if self.has_version(i)])
+        aliases.update(self.metadata_cache.get_id_aliases([i for i in missing_ids if not self.has_version(i)],
+                                                          max_age=self.versionless_max_age))
+        cached_results = self.metadata_cache.get_results(set(aliases.values()))
+        for arxiv_id, entry_id in aliases.items():
+            if entry_id in cached_results:
+                res[arxiv_id] = cached_results[entry_id]
+        return res
+
+    def __fetch_batch(self, arxiv_ids):
+        search_instance = arxiv.Search(id_list=arxiv_ids, max_results=len(arxiv_ids))
+        try:
+            with self.__client_lock:
+                result_list = list(self.client.results(search_instance))
+        except Exception as e:
+            if len(arxiv_ids) == 1:
+                logger.error(f"Cannot resolve arxiv id {arxiv_ids[0]}: {str(e)}")
+                return {}
+            logger.warning(f"Id batch of {len(arxiv_ids)} rejected, split it: {str(e)}")
+            middle = len(arxiv_ids) // 2
+            res = self.__fetch_batch(arxiv_ids[:middle])
+            res.update(self.__fetch_batch(arxiv_ids[middle:]))
+            return res
+        res = {}
+        requested_ids = set(arxiv_ids)
+        for result_instance in result_list:
+            requested_id = self.match_requested_id(result_instance, requested_ids)
+            if requested_id:
+                res[requested_id] = result_instance
+        return res
+
+    def resolve(self, id_list):
+        """
+        :param id_list: arxiv ids in any of the accepted forms, duplicates are resolved once.
+        :return: Dict of normalized arxiv id -> arxiv.Result in id_list order, unresolvable ids are left out.
+        """
+        arxiv_ids = list(dict.fromkeys(self.normalize_id(i) for i in id_list))
+        res = self.__lookup_cache(arxiv_ids)
+        missing_ids = [i for i in arxiv_ids if i not in res]
+        logger.info(f"Resolve {len(arxiv_ids)} arxiv ids: {len(res)} cached, {len(missing_ids)} from API.")
+        for i in range(0, len(missing_ids), self.batch_size):
+            fetched = self.__fetch_batch(missing_ids[i:i + self.batch_size])
+            if self.metadata_cache and fetched:
+                self.metadata_cache.store_results(list(fetched.values()))
+                self.metadata_cache.store_id_aliases({arxiv_id: result_instance.entry_id
+                                                      for arxiv_id, result_instance in fetched.items()})
+            res.update(fetched)
+        for arxiv_id in missing_ids:
+            if arxiv_id not in res:
+                logger.warning(f"arxiv id not found: {arxiv_id}")
+        self.__memo.update(res)
+        return {i: res[i] for i in arxiv_ids if i in res}
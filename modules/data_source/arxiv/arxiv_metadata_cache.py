@@ -0,0 +1,286 @@
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import arxiv
+from loguru import logger
+
+
+class ArxivMetadataCache:
+    """
+    Local SQLite cache of arxiv.Result metadata.
+    Results are indexed by entry_id, category and updated time. For every query string the cache also records
+    which updated-time windows have been paged completely, so an overlapping window only fetches the uncovered
+    newest part from the API and serves the rest from disk.
+    A query keeps only the newest version of a paper, storing v2 replaces the v1 row of the query.
+    """
+
+    def __init__(self, db_path, settle_hours=48):
+        """
+        :param db_path: SQLite file path.
+        :param settle_hours: arXiv announces papers with a delay, so the newest settle_hours of a window are never
+        marked as covered and are always re-paged.
+        """
+        self.__db_path = str(db_path)
+        self.__settle = timedelta(hours=settle_hours)
+        self.__lock = threading.Lock()
+        Path(self.__db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.__init_tables()
+
+    @contextmanager
+    def __connect(self):
+        conn = sqlite3.connect(self.__db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __init_tables(self):
+        with self.__lock, self.__connect() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS results (
+                    entry_id TEXT PRIMARY KEY,
+                    updated TEXT,
+                    published TEXT,
+                    primary_category TEXT,
+                    payload TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_results_updated ON results (updated);
+                CREATE TABLE IF NOT EXISTS result_categories (
+                    entry_id TEXT,
+                    category TEXT,
+                    PRIMARY KEY (entry_id, category)
+                );
+                CREATE INDEX IF NOT EXISTS idx_result_categories_category ON result_categories (category);
+                CREATE TABLE IF NOT EXISTS query_results (
+                    query_str TEXT,
+                    entry_id TEXT,
+                    PRIMARY KEY (query_str, entry_id)
+                );
+                CREATE TABLE IF NOT EXISTS query_coverage (
+                    query_str TEXT,
+                    start_ts TEXT,
+                    end_ts TEXT,
+                    fetched_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_query_coverage_query ON query_coverage (query_str);
+                CREATE TABLE IF NOT EXISTS id_aliases (
+                    arxiv_id TEXT PRIMARY KEY,
+                    entry_id TEXT,
+                    resolved_at TEXT
+                );
+            ''')
+
+    @staticmethod
+    def to_utc_str(ts: datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+    @staticmethod
+    def split_version(entry_id: str):
+        """
+        http://arxiv.org/abs/2310.12345v2 -> (http://arxiv.org/abs/2310.12345, 2)
+        """
+        matched = re.match(r'^(.*?)v(\d+)$', entry_id)
+        return (matched.group(1), int(matched.group(2))) if matched else (entry_id, 0)
+
+    @classmethod
+    def dedupe_versions(cls, result_list):
+        """
+        Keep the newest version of every paper, in the order of result_list.
+        """
+        newest = {}
+        for res in result_list:
+            versionless_id, version = cls.split_version(res.entry_id)
+            if versionless_id not in newest or version > cls.split_version(newest[versionless_id].entry_id)[1]:
+                newest[versionless_id] = res
+        kept_ids = set(res.entry_id for res in newest.values())
+        return [res for res in result_list if res.entry_id in kept_ids]
+
+    @staticmethod
+    def dump_result(result_instance: arxiv.Result):
+        return json.dumps({'entry_id': result_instance.entry_id,
+                           'updated': result_instance.updated.isoformat(),
+                           'published': result_instance.published.isoformat(),
+                           'title': result_instance.title,
+                           'authors': [author.name for author in result_instance.authors],
+                           'summary': result_instance.summary,
+                           'comment': result_instance.comment,
+                           'journal_ref': result_instance.journal_ref,
+                           'doi': result_instance.doi,
+                           'primary_category': result_instance.primary_category,
+                           'categories': result_instance.categories,
+                           'links': [{'href': link.href,
+                                      'title': link.title,
+                                      'rel': link.rel,
+                                      'content_type': link.content_type} for link in result_instance.links]},
+                          ensure_ascii=False)
+
+    @staticmethod
+    def load_result(payload: str):
+        data = json.loads(payload)
+        return arxiv.Result(entry_id=data['entry_id'],
+                            updated=datetime.fromisoformat(data['updated']),
+                            published=datetime.fromisoformat(data['published']),
+                            title=data['title'],
+                            authors=[arxiv.Result.Author(name) for name in data['authors']],
+                            summary=data['summary'],
+                            comment=data['comment'],
+                            journal_ref=data['journal_ref'],
+                            doi=data['doi'],
+                            primary_category=data['primary_category'],
+                            categories=data['categories'],
+                            links=[arxiv.Result.Link(**link) for link in data['links']])
+
+    def store_results(self, result_list, query_str=None):
+        if not result_list:
+            return
+        with self.__lock, self.__connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                             [(res.entry_id, self.to_utc_str(res.updated), self.to_utc_str(res.published),
+                               res.primary_category, self.dump_result(res)) for res in result_list])
+            conn.executemany('INSERT OR IGNORE INTO result_categories VALUES (?, ?)',
+                             [(res.entry_id, category) for res in result_list for category in res.categories])
+            if query_str is not None:
+                self.__store_query_results(conn, query_str, result_list)
+
+    def __store_query_results(self, conn, query_str, result_list):
+        """
+        Link result_list to query_str, replacing the older versions already linked.
+        """
+        for res in self.dedupe_versions(result_list):
+            versionless_id, version = self.split_version(res.entry_id)
+            linked_ids = [entry_id for entry_id, in conn.execute(
+                'SELECT entry_id FROM query_results WHERE query_str = ? AND entry_id LIKE ?',
+                (query_str, f'{versionless_id}v%')).fetchall()
+                if self.split_version(entry_id)[0] == versionless_id]
+            if any(self.split_version(entry_id)[1] > version for entry_id in linked_ids):
+                continue
+            conn.executemany('DELETE FROM query_results WHERE query_str = ? AND entry_id = ?',
+                             [(query_str, entry_id) for entry_id in linked_ids if entry_id != res.entry_id])
+            conn.execute('INSERT OR IGNORE INTO query_results VALUES (?, ?)', (query_str, res.entry_id))
+
+    def get_results(self, entry_ids):
+        """
+        :param entry_ids:
+        :return: Dict of entry_id -> arxiv.Result for the cached ones.
+        """
+        entry_ids = list(entry_ids)
+        res = {}
+        with self.__lock, self.__connect() as conn:
+            for i in range(0, len(entry_ids), 500):
+                chunk = entry_ids[i:i + 500]
+                rows = conn.execute(f'SELECT entry_id, payload FROM results '
+                                    f'WHERE entry_id IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+                res.update({entry_id: self.load_result(payload) for entry_id, payload in rows})
+        return res
+
+    def store_id_aliases(self, alias_dict):
+        """
+        :param alias_dict: Requested arxiv id (e.g. 2310.12345 or 2310.12345v2) -> resolved entry_id.
+        """
+        if not alias_dict:
+            return
+        resolved_at = self.to_utc_str(datetime.now(timezone.utc))
+        with self.__lock, self.__connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO id_aliases VALUES (?, ?, ?)',
+                             [(arxiv_id, entry_id, resolved_at) for arxiv_id, entry_id in alias_dict.items()])
+
+    def get_id_aliases(self, arxiv_ids, max_age: timedelta = None):
+        """
+        :param arxiv_ids:
+        :param max_age: Aliases resolved earlier than max_age ago are ignored.
+        :return: Dict of arxiv id -> entry_id for the cached ones.
+        """
+        arxiv_ids = list(arxiv_ids)
+        min_resolved_at = self.to_utc_str(datetime.now(timezone.utc) - max_age) if max_age else ''
+        res = {}
+        with self.__lock, self.__connect() as conn:
+            for i in range(0, len(arxiv_ids), 500):
+                chunk = arxiv_ids[i:i + 500]
+                rows = conn.execute(f'SELECT arxiv_id, entry_id FROM id_aliases '
+                                    f'WHERE resolved_at >= ? AND arxiv_id IN ({",".join("?" * len(chunk))})',
+                                    [min_resolved_at] + chunk).fetchall()
+                res.update(dict(rows))
+        return res
+
+    def get_query_results(self, query_str, start_ts: datetime, end_ts: datetime, covered_until: datetime):
+        """
+        Cached results of query_str with start_ts < updated < end_ts and updated <= covered_until, newest first.
+        Only the newest version of every paper is returned.
+        """
+        with self.__lock, self.__connect() as conn:
+            rows = conn.execute('SELECT r.payload FROM results r JOIN query_results q ON r.entry_id = q.entry_id '
+                                'WHERE q.query_str = ? AND r.updated > ? AND r.updated < ? AND r.updated <= ? '
+                                'ORDER BY r.updated DESC',
+                                (query_str, self.to_utc_str(start_ts), self.to_utc_str(end_ts),
+                                 self.to_utc_str(covered_until))).fetchall()
+        return self.dedupe_versions([self.load_result(payload) for payload, in rows])
+
+    def get_covered_until(self, query_str, start_ts: datetime):
+        """
+        Follow the recorded coverage windows of query_str from start_ts.
+        :return: The furthest updated time reachable from start_ts without a gap, or None if start_ts is uncovered.
+        """
+        start_str = self.to_utc_str(start_ts)
+        with self.__lock, self.__connect() as conn:
+            rows = conn.execute('SELECT start_ts, end_ts FROM query_coverage WHERE query_str = ? ORDER BY start_ts',
+                                (query_str,)).fetchall()
+        covered_until = None
+        for window_start, window_end in rows:
+            reach = covered_until if covered_until else start_str
+            if window_start > reach:
+                break
+            if window_end >= reach:
+                covered_until = window_end
+        return datetime.fromisoformat(covered_until) if covered_until else None
+
+    def record_coverage(self, query_str, start_ts: datetime, end_ts: datetime):
+        if end_ts <= start_ts:
+            return
+        with self.__lock, self.__connect() as conn:
+            conn.execute('INSERT INTO query_coverage VALUES (?, ?, ?, ?)',
+                         (query_str, self.to_utc_str(start_ts), self.to_utc_str(end_ts),
+                          self.to_utc_str(datetime.now(timezone.utc))))
+
+    def results(self, client: arxiv.Client, search_instance: arxiv.Search, updated_time_range, page_size=50):
+        """
+        Drop-in replacement of client.results for a search sorted by LastUpdatedDate descending.
+        Only the part of updated_time_range newer than the cached coverage is paged from the API.
+        :return: Generator of arxiv.Result within updated_time_range, newest first, one version per paper.
+        """
+        query_str = search_instance.query
+        start_ts, end_ts = updated_time_range
+        settled_ts = min(end_ts, datetime.now(timezone.utc) - self.__settle)
+        covered_until = self.get_covered_until(query_str, start_ts)
+        yielded_ids = set()
+        if covered_until and covered_until >= end_ts:
+            logger.info(f"Metadata cache covers {query_str} entirely.")
+        else:
+            fetch_from = covered_until if covered_until else start_ts
+            logger.info(f"Metadata cache: paging {query_str} from API for updated > {fetch_from}")
+            page_buffer = []
+            for result_instance in client.results(search_instance):
+                if result_instance.updated <= fetch_from:
+                    break
+                page_buffer.append(result_instance)
+                if len(page_buffer) >= page_size:
+                    self.store_results(page_buffer, query_str)
+                    page_buffer = []
+                if result_instance.updated < end_ts:
+                    yielded_ids.add(self.split_version(result_instance.entry_id)[0])
+                    yield result_instance
+            self.store_results(page_buffer, query_str)
+            # Only claim the settled part of the window, newer papers may still be announced.
+            self.record_coverage(query_str, fetch_from, settled_ts)
+        if covered_until:
+            for result_instance in self.get_query_results(query_str, start_ts, end_ts, covered_until):
+                # A paper revised since the coverage was recorded has been yielded from the API already
+                if self.split_version(result_instance.entry_id)[0] not in yielded_ids:
+                    yield result_instance
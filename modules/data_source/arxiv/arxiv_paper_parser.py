@@ -1,7 +1,7 @@
 import traceback
 
 from modules.models import Paper
-from modules.models import XmindNodeList, PaperKeypoints
+from modules.models import XmindNodeList, PaperKeypoints, PaperXmindDigest, parse_paper_xmind_digest
 from langchain.output_parsers import PydanticOutputParser
 from tenacity import retry, stop_after_attempt, wait_random
 from loguru import logger
@@ -10,6 +10,7 @@ from xmind.core.markerref import MarkerId
 import sys
 from pathlib import Path
 from modules.pdf_extract import get_objpixmap
+from modules.llm_utils import validate_llm_response
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from XmindCopilot import XmindCopilot
@@ -21,10 +22,16 @@ from XmindCopilot import XmindCopilot
 
 
 class PaperParser:
-    def __init__(self, llm_engine, db_instance=None, language='Chinese'):
+    def __init__(self, llm_engine, db_instance=None, language='Chinese', combined_structured_output=True):
+        """
+        :param combined_structured_output: Generate xmind nodes and keypoints of a paper with one LLM call.
+        """
         self.__llm_engine = llm_engine
+        self.combined_structured_output = combined_structured_output
         self.__db_instance = db_instance
         self.__default_language = language
+        # Run-level memo of (entry_id, field) -> final report content, shared by every field of a routine run.
+        self.__summary_memo = {}
 
     def _step1_summarize_with_title_abs_intro(self, paper_instance: Paper, field=None):
         text = 'Title:' + paper_instance.title
@@ -156,7 +163,27 @@ This is the <summary> and <conclusion> part of an English literature, where <sum
         res = self.__llm_engine.predict(prompt)
         return res
 
+    def clear_summary_memo(self):
+        self.__summary_memo = {}
+
+    def needs_paper_text(self, paper_instance: Paper, field=None):
+        """
+        Whether summarize_single_paper(paper_instance, field) reads the PDF text, i.e. a summary step is neither
+        memoized nor stored.
+        """
+        if paper_instance.url and (paper_instance.url, field) in self.__summary_memo:
+            return False
+        if not self.__db_instance:
+            return True
+        return not all([self.__db_instance.get_step1_summary(paper_instance.url),
+                        self.__db_instance.get_step2_summary(paper_instance.url),
+                        self.__db_instance.get_step3_summary(paper_instance.url)])
+
     def summarize_single_paper(self, paper_instance: Paper, field=None):
+        memo_key = (paper_instance.url, field)
+        if paper_instance.url and memo_key in self.__summary_memo:
+            logger.info(f"Summary of {paper_instance.url} ({field}) already generated in this run.")
+            return self.__summary_memo[memo_key]
         logger.warning("Step 1: Get chat summary text with title/abs/intro")
         if self.__db_instance:
             chat_summary_text = self.__db_instance.get_step1_summary(paper_instance.url)
@@ -214,8 +241,103 @@ This is the <summary> and <conclusion> part of an English literature, where <sum
         else:
             report_content = report_content_raw
         logger.success(f"Total report: {report_content}")
+        if paper_instance.url:
+            self.__summary_memo[memo_key] = report_content
         return report_content
 
+    def load_structured_summary(self, paper_instance: Paper, column_name, model_cls):
+        """
+        Read the structured output (XmindNodeList / PaperKeypoints) of the paper from DB.
+        :param column_name: xmind_nodes or paper_keypoints, see RawDataStorage.get_<column_name>.
+        :return: model_cls instance, None if missing or not valid.
+        """
+        if not self.__db_instance or not paper_instance.url:
+            return None
+        stored_json = getattr(self.__db_instance, f'get_{column_name}')(paper_instance.url)
+        if not stored_json:
+            return None
+        try:
+            res = model_cls.model_validate_json(stored_json)
+            logger.warning(f"{column_name} already exist.")
+            return res
+        except Exception as e:
+            logger.warning(f"Stored {column_name} of {paper_instance.url} invalid, regenerate: {str(e)}")
+            return None
+
+    def store_structured_summary(self, paper_instance: Paper, column_name, res):
+        if self.__db_instance and paper_instance.url:
+            getattr(self.__db_instance, f'upload_{column_name}')(paper_instance.url, res.model_dump_json())
+
+    def get_structured_summary(self, paper_instance: Paper, column_name, model_cls, generate_func):
+        """
+        Stored structured output of the paper, generated and stored if missing.
+        """
+        res = self.load_structured_summary(paper_instance, column_name, model_cls)
+        if res is None:
+            res = generate_func()
+            self.store_structured_summary(paper_instance, column_name, res)
+        return res
+
+    def get_xmind_nodes_and_keypoints(self, paper_instance: Paper, summary: str):
+        """
+        :return: (XmindNodeList or [], PaperKeypoints or [])
+        Stored outputs are reused. In combined mode the missing ones come from one generate_xmind_digest_from_summary
+        call, the separate prompts are only used for a field the digest did not fill.
+        """
+        nodes = self.load_structured_summary(paper_instance, 'xmind_nodes', XmindNodeList)
+        keypoints = self.load_structured_summary(paper_instance, 'paper_keypoints', PaperKeypoints)
+        if self.combined_structured_output and (nodes is None or keypoints is None):
+            try:
+                digest = self.generate_xmind_digest_from_summary(summary)
+                if nodes is None and digest.NodeList:
+                    nodes = XmindNodeList(NodeList=digest.NodeList)
+                    self.store_structured_summary(paper_instance, 'xmind_nodes', nodes)
+                if keypoints is None and digest.keypoints:
+                    keypoints = PaperKeypoints(keypoints=digest.keypoints)
+                    self.store_structured_summary(paper_instance, 'paper_keypoints', keypoints)
+            except Exception as e:
+                logger.error(f"Combined structured output failed, use separate prompts: {str(e)}")
+        if nodes is None:
+            try:
+                nodes = self.get_structured_summary(paper_instance, 'xmind_nodes', XmindNodeList,
+                                                    lambda: self.generate_xmind_node_from_summary(summary))
+            except Exception as e:
+                logger.error(str(e))
+                nodes = []
+        if keypoints is None:
+            try:
+                keypoints = self.get_structured_summary(paper_instance, 'paper_keypoints', PaperKeypoints,
+                                                        lambda: self.generate_paper_keypoints_from_summary(summary))
+            except Exception as e:
+                logger.error(str(e))
+                keypoints = []
+        return nodes, keypoints
+
+    @retry(wait=wait_random(min=1, max=3), stop=stop_after_attempt(3))
+    def generate_xmind_digest_from_summary(self, summary: str) -> PaperXmindDigest:
+        parser = PydanticOutputParser(pydantic_object=PaperXmindDigest)
+
+        prompt = """你是一个阅读过很多论文的学者。我需要你根据对于论文的总结同时完成两件事：
+        1. 生成思维导图（NodeList）：从不同方面（例如但不仅限于：1）论文信息 2）论文创新点 3）论文的具体切入方向 4）论文的贡献 
+        5）论文的核心）为切入点，尤其关注量化的数据。
+        2. 生成该论文的关键词（keypoints）：关键词可以是论文的核心，论文用到的方法，论文的领域等等。
+        以JSON的格式返回给我。{format_instructions}
+        Input:
+        {summary}
+        Output:
+        <Your answer>"""
+        logger.debug("try to generate nodes and key-points")
+        # 无法解析的回复不进入缓存, 重试时重新请求
+        with validate_llm_response(parse_paper_xmind_digest):
+            res_content = self.__llm_engine.predict(
+                prompt.format(summary=summary,
+                              format_instructions=parser.get_format_instructions()))
+        logger.debug(res_content)
+        # 格式小错误在本地修复, 不重新请求
+        digest = parse_paper_xmind_digest(res_content)
+        logger.debug(digest)
+        return digest
+
     @retry(wait=wait_random(min=1, max=3), stop=stop_after_attempt(3))
     def generate_xmind_node_from_summary(self, summary: str) -> XmindNodeList:
         parser = PydanticOutputParser(pydantic_object=XmindNodeList)
@@ -227,9 +349,10 @@ This is the <summary> and <conclusion> part of an English literature, where <sum
         Output:
         <Your answer>"""
         logger.debug("try to generate nodes")
-        res_content = self.__llm_engine.predict(
-            prompt.format(summary=summary,
-                          format_instructions=parser.get_format_instructions()))
+        with validate_llm_response(parser.parse):
+            res_content = self.__llm_engine.predict(
+                prompt.format(summary=summary,
+                              format_instructions=parser.get_format_instructions()))
         logger.debug(prompt.format(summary=summary,
                                    format_instructions=parser.get_format_instructions()))
         logger.debug(res_content)
@@ -247,9 +370,10 @@ This is the <summary> and <conclusion> part of an English literature, where <sum
                 Output:
                 <Your answer>"""
         logger.debug("try to generate key-points")
-        res_content = self.__llm_engine.predict(
-            prompt.format(summary=summary,
-                          format_instructions=parser.get_format_instructions()))
+        with validate_llm_response(parser.parse):
+            res_content = self.__llm_engine.predict(
+                prompt.format(summary=summary,
+                              format_instructions=parser.get_format_instructions()))
         logger.debug(prompt.format(summary=summary,
                                    format_instructions=parser.get_format_instructions()))
         logger.debug(res_content)
@@ -309,17 +433,7 @@ This is the <summary> and <conclusion> part of an English literature, where <sum
         if paper_instance.url:
             root_topic.setURLHyperlink(paper_instance.url)
         analysis_result = self.summarize_single_paper(paper_instance, field)
-        try:
-            nodes = self.generate_xmind_node_from_summary(analysis_result)
-        except Exception as e:
-            logger.error(str(e))
-            nodes = []
-
-        try:
-            keypoints = self.generate_paper_keypoints_from_summary(analysis_result)
-        except Exception as e:
-            logger.error(str(e))
-            keypoints = []
+        nodes, keypoints = self.get_xmind_nodes_and_keypoints(paper_instance, analysis_result)
 
         main_result = root_topic.addSubTopic()
         # reformatted_summary = ""
@@ -365,7 +479,7 @@ This is the <summary> and <conclusion> part of an English literature, where <sum
                     section_node = root_topic.addSubTopic()
                     section_node.setTitle(name)
                     for img in img_ls:
-                        img_tempdir = get_objpixmap(paper_instance.pdf, img)
+                        img_tempdir = get_objpixmap(paper_instance.pdf, img, checksum=paper_instance.checksum)
                         topic = section_node.addSubTopicbyImage(img_tempdir, img_ls.index(img))
                         # FIXME: This is a temporary solution for compatibility
                         if len(img) == 4:
@@ -377,7 +491,7 @@ This is the <summary> and <conclusion> part of an English literature, where <sum
                     section_node = root_topic.addSubTopic(name)
                     img_ls = img_dict[name][::-1]
                     for img in img_ls:
-                        img_tempdir = get_objpixmap(paper_instance.pdf, img)
+                        img_tempdir = get_objpixmap(paper_instance.pdf, img, checksum=paper_instance.checksum)
                         topic = section_node.addSubTopicbyImage(img_tempdir, img_ls.index(img))
                         # FIXME: This is a temporary solution for compatibility
                         if len(img) == 4:
@@ -10,14 +10,20 @@ from itertools import takewhile
 import json
 import tenacity
 from tqdm import tqdm
-from func_timeout import func_set_timeout
 import logging
 logging.basicConfig(level=logging.DEBUG)
-import fitz
 
 # logging.basicConfig(level=logging.DEBUG)
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import queue
+from .arxiv_rate_limiter import HostRateLimiter
+from .arxiv_metadata_cache import ArxivMetadataCache
+from .arxiv_pdf_store import PdfStore
+from .arxiv_downloader import ResumableDownloader
+from .arxiv_id_resolver import ArxivIdResolver
+from .arxiv_filter import ResultFilter
+from .arxiv_async_retriever import AsyncArxivBackend
 
 QUERY_ABBR_MAPPING = {'title': 'ti',
                       'author': 'au',
@@ -30,13 +36,77 @@ QUERY_ABBR_MAPPING = {'title': 'ti',
 
 
 class PaperRetriever:
-    def __init__(self, db_instance, storage_path: str):
+    # Retrieval status keys of a download history besides download_history, see dump_download_history
+    HISTORY_STATUS_KEYS = ('failed_entries', 'retrieval_complete')
+
+    def __init__(self, db_instance, storage_path: str, max_download_workers=4, download_delay_seconds=3.0,
+                 use_metadata_cache=True, metadata_cache_settle_hours=48, retrieval_backend='sync'):
         self.__storage_path_base = Path(storage_path)
         os.makedirs(self.__storage_path_base, exist_ok=True)
         self.__log_path = self.__storage_path_base / 'logs' / str(datetime.now().strftime('%Y-%m-%d'))
         self.__raw_paper_storage_path = self.__storage_path_base / 'paper_raw'
 
         self.db_instance = db_instance
+        self.pdf_store = PdfStore(self.__raw_paper_storage_path)
+        # Download pool
+        self.max_download_workers = max(1, int(max_download_workers))
+        self.rate_limiter = HostRateLimiter(delay_seconds=download_delay_seconds)
+        self.downloader = ResumableDownloader(rate_limiter=self.rate_limiter,
+                                              max_pool_size=self.max_download_workers)
+        self.__db_lock = threading.Lock()
+        # Search metadata cache
+        self.metadata_cache = ArxivMetadataCache(self.__storage_path_base / 'arxiv_metadata_cache.sqlite3',
+                                                 settle_hours=metadata_cache_settle_hours) \
+            if use_metadata_cache else None
+        self.id_resolver = ArxivIdResolver(metadata_cache=self.metadata_cache,
+                                           versionless_max_age=timedelta(hours=metadata_cache_settle_hours))
+        # Retrieval backend, None search_client means a fresh arxiv.Client per search.
+        self.backend = 'sync'
+        self.search_client = None
+        self.async_backend = None
+        self.__sync_downloader = self.downloader
+        self.__sync_id_client = self.id_resolver.client
+        self.use_backend(retrieval_backend)
+
+    def use_backend(self, backend='sync'):
+        """
+        Switch search paging, id lookups and PDF fetches between the sync clients and AsyncArxivBackend.
+        Falls back to sync if the async backend cannot be started (e.g. aiohttp is not installed).
+        :param backend: 'sync' or 'async'
+        :return: The backend in use.
+        """
+        if backend == 'async':
+            if self.async_backend is None:
+                try:
+                    self.async_backend = AsyncArxivBackend(rate_limiter=self.rate_limiter,
+                                                           max_concurrency=self.max_download_workers)
+                except Exception as e:
+                    logger.warning(f"Async backend unavailable, fall back to sync: {str(e)}")
+                    backend = 'sync'
+        elif backend != 'sync':
+            logger.warning(f"Unknown retrieval backend {backend}, use sync.")
+            backend = 'sync'
+
+        if backend == 'async':
+            self.downloader = self.async_backend
+            self.id_resolver.client = self.async_backend
+            self.search_client = self.async_backend
+        else:
+            self.downloader = self.__sync_downloader
+            self.id_resolver.client = self.__sync_id_client
+            self.search_client = None
+        self.backend = backend
+        return backend
+
+    def close(self):
+        """
+        Flush the PDF index and stop the async backend loop and its connections, if started.
+        """
+        self.pdf_store.flush()
+        self.use_backend('sync')
+        if self.async_backend is not None:
+            self.async_backend.close()
+            self.async_backend = None
 
     @staticmethod
     def retrieve_topic_w_regex(summary_regex=None,
@@ -46,6 +116,8 @@ class PaperRetriever:
                                target_primary_category=None,
                                updated_time_range=None,
                                diy_query_str=None,
+                               metadata_cache: ArxivMetadataCache = None,
+                               client=None,
                                **kwargs):
         if diy_query_str:
             query_str = diy_query_str
@@ -71,47 +143,29 @@ class PaperRetriever:
                 return False
             return True
 
-        def should_pick(x):
-            """
-            summary, title, link ,
-            :param x:
-            :return:
-            """
-            _summary = x.summary
-            _title = x.title
-            _journal_reference = x.journal_ref
-            _subject_category = "+".join(x.categories)
-            _primary_subject = x.primary_category
-            if summary_regex and not re.search(summary_regex, _summary):
-                return False
-            if title_regex and not re.search(title_regex, _title):
-                return False
-            if journal_ref_regex and not re.search(journal_ref_regex, _journal_reference):
-                return False
-            if target_subject_category:
-                for ts in target_subject_category:
-                    if ts not in _subject_category:
-                        return False
-            if target_primary_category:
-                for ts in target_primary_category:
-                    if ts not in _primary_subject:
-                        return False
-            return True
+        should_pick = ResultFilter(summary_regex=summary_regex,
+                                   title_regex=title_regex,
+                                   journal_ref_regex=journal_ref_regex,
+                                   target_subject_category=target_subject_category,
+                                   target_primary_category=target_primary_category)
 
-        client = arxiv.Client(
-            page_size=50,
-            delay_seconds=1.0,
-            num_retries=5
-        )
+        if client is None:
+            client = arxiv.Client(
+                page_size=50,
+                delay_seconds=1.0,
+                num_retries=5
+            )
 
         if updated_time_range:
             sort_by = arxiv.SortCriterion.LastUpdatedDate
             search_instance = arxiv.Search(query=query_str, sort_by=sort_by, sort_order=arxiv.SortOrder.Descending)
-            return filter(should_pick, takewhile(within_time_range, client.results(search_instance)))
+            if metadata_cache:
+                return should_pick(metadata_cache.results(client, search_instance, updated_time_range))
+            return should_pick(takewhile(within_time_range, client.results(search_instance)))
             # return takewhile(within_time_range, search_instance.results())
         else:
             search_instance = arxiv.Search(query=query_str)
-            return filter(should_pick, client.results(search_instance))
+            return should_pick(client.results(search_instance))
 
     @staticmethod
     def sanitize_filename(filename):
@@ -120,153 +174,138 @@ class PaperRetriever:
         return sanitized_filename
 
     @tenacity.retry(wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
-                    stop=tenacity.stop_after_attempt(2),
+                    stop=tenacity.stop_after_attempt(4),
                     reraise=True)
     def download(self, result_instance: arxiv.Result):
-        @func_set_timeout(600)
-        def _download():
-            logger.info(f"Try to download {result_instance}")
-            downloaded_name = self.sanitize_filename(result_instance.title)
-            target_downloaded_path = self.__raw_paper_storage_path / f'{downloaded_name}.pdf'
-            if target_downloaded_path.exists():
-                _pdf = fitz.open(target_downloaded_path)
-                if _pdf.page_count > 0:
-                    logger.warning(f"Already downloaded at {target_downloaded_path}. Page count: {_pdf.page_count}")
-                    _pdf.close()
-                    return str(target_downloaded_path.absolute())
-                _pdf.close()
-
-            downloaded_path = result_instance.download_pdf(dirpath=str(self.__raw_paper_storage_path),
-                                                           filename=downloaded_name + '.pdf')
-            logger.success(f"Downloaded at {downloaded_path}")
+        # A failed attempt keeps its .part file, so a retry resumes instead of starting over.
+        logger.info(f"Try to download {result_instance}")
+        stored_path = self.pdf_store.lookup(result_instance.entry_id)
+        if stored_path:
+            logger.warning(f"Already downloaded at {stored_path}.")
+            return stored_path
+        # Files stored by sanitized title before the id keyed store are validated once and indexed in place.
+        legacy_downloaded_path = self.__raw_paper_storage_path / f'{self.sanitize_filename(result_instance.title)}.pdf'
+        if legacy_downloaded_path.exists():
+            try:
+                self.pdf_store.register(result_instance.entry_id, legacy_downloaded_path,
+                                        title=result_instance.title)
+                return str(legacy_downloaded_path.absolute())
+            except Exception as e:
+                logger.warning(f"Legacy file {legacy_downloaded_path} is not usable: {str(e)}")
+
+        target_downloaded_path = self.pdf_store.get_target_path(result_instance.entry_id)
+        try:
+            downloaded_path = self.downloader.fetch(result_instance.pdf_url, target_downloaded_path)
+        except Exception as e:
+            logger.error(f"Download failed. {result_instance.title}: {str(e)}")
+            logger.debug(traceback.format_exc())
+            raise
+        self.pdf_store.register(result_instance.entry_id, downloaded_path, title=result_instance.title)
+        logger.success(f"Downloaded at {downloaded_path}")
+        # DB session is shared by all download threads.
+        with self.__db_lock:
             self.db_instance.upload_paper_raw_data(entry_id=result_instance.entry_id,
                                                    title=result_instance.title,
                                                    summary=result_instance.summary,
                                                    primary_category=result_instance.primary_category,
                                                    publish_time=result_instance.published)
-            return downloaded_path
+        return str(Path(downloaded_path).absolute())
+
+    def download_and_record(self, res_entry: arxiv.Result):
+        downloaded_path = self.download(res_entry)
+        entry_dict = res_entry.__dict__
+        info_dict = {i: entry_dict[i] for i in entry_dict.keys() if i[0] != '_'}
+        pdf_record = self.pdf_store.get_record(res_entry.entry_id) or {}
+        return {'downloaded_pdf_path': downloaded_path,
+                'info': str(info_dict),
+                'updated': res_entry.updated.isoformat(),
+                'sha256': pdf_record.get('sha256')}
+
+    def download_pipeline(self, task_gen):
+        """
+        Producer/consumer download: search results are paged into a bounded queue while the download
+        workers consume it, so paging and transfers overlap and only a few results are held in memory.
+        :param task_gen: Iterable of arxiv.Result.
+        :return: (download history dict in search order, dict of entry_id -> {'updated', 'error'} of the failed
+        downloads, False if the search stopped with an error before it was exhausted)
+        """
+        task_queue = queue.Queue(maxsize=self.max_download_workers * 2)
+        # 创建tqdm进度条, total is unknown until the search is exhausted.
+        progress_bar = tqdm(desc="Downloading", unit="file")
+        progress_lock = threading.Lock()
+        # Records are keyed by task index so the history keeps the search order of a serial run.
+        download_records = {}
+        failed_entries = {}
+        search_complete = [True]
+        produced_count = [0]
+
+        def produce():
+            try:
+                for task_idx, task in enumerate(task_gen):
+                    logger.info(f'{task} imported')
+                    task_queue.put((task_idx, task))
+                    produced_count[0] += 1
+            except Exception as e:
+                logger.warning(f"Search stopped before it was exhausted: {str(e)}")
+                search_complete[0] = False
+            finally:
+                for _ in range(self.max_download_workers):
+                    task_queue.put(None)
+
+        def consume():
+            while True:
+                task = task_queue.get()
+                if task is None:
+                    break
+                task_idx, res_entry = task
+                try:
+                    record = self.download_and_record(res_entry)
+                    with progress_lock:
+                        download_records[task_idx] = (res_entry.entry_id, record)
+                        progress_bar.update(1)  # 更新进度条
+                except Exception as e:
+                    logger.error(f'Error in download_and_store: {e}')
+                    logger.debug(traceback.format_exc())
+                    with progress_lock:
+                        failed_entries[res_entry.entry_id] = {'updated': res_entry.updated.isoformat(),
+                                                              'error': str(e)}
+
+        producer = threading.Thread(target=produce, name='arxiv-search-producer', daemon=True)
+        producer.start()
+        with ThreadPoolExecutor(max_workers=self.max_download_workers) as executor:
+            for _ in range(self.max_download_workers):
+                executor.submit(consume)
+        producer.join()
+        # 本批次登记的PDF一次写入索引
+        self.pdf_store.flush()
 
-        try:
-            return _download()
-        except Exception as e:
-            logger.error(f"Download timeout. {result_instance.title}")
-            logger.debug(traceback.format_exc())
-            raise Exception(str(e))
-
-    # def main(self, summary_regex=None,
-    #          title_regex=None,
-    #          journal_ref_regex=None,
-    #          target_subject_category=None,
-    #          target_primary_category=None,
-    #          updated_time_range=None,
-    #          diy_query_str=None,
-    #          bulk_description=None,
-    #          field=None,
-    #          **kwargs):
-    #     download_lock = threading.Lock()
-    #     download_history_dict = {}
-    #
-    #     def download_and_store(res_entry):
-    #         try:
-    #             downloaded_path = self.download(res_entry)
-    #             entry_dict = res_entry.__dict__
-    #             info_dict = {i: entry_dict[i] for i in entry_dict.keys() if i[0] != '_'}
-    #             with download_lock:
-    #                 download_history_dict[res_entry.entry_id] = {'downloaded_pdf_path': downloaded_path,
-    #                                                              'info': str(info_dict)}
-    #             # progress_bar.update(1)  # 更新进度条
-    #         except Exception as e:
-    #             logger.error(f'Error in download_and_store: {e}')
-    #             logger.debug(traceback.format_exc())
-    #
-    #     # 创建一个ThreadPoolExecutor，限制同时并发的线程数量为10
-    #     max_workers = 1
-    #     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-    #         task_gen = self.retrieve_topic_w_regex(summary_regex, title_regex, journal_ref_regex,
-    #                                                target_subject_category,
-    #                                                target_primary_category, updated_time_range, diy_query_str,
-    #                                                **kwargs)
-    #         task_list = []
-    #         try:
-    #             for task in task_gen:
-    #                 logger.info(f'{task} imported')
-    #                 task_list.append(task)
-    #         except:
-    #             pass
-    #
-    #         # # 获取迭代器的结果并存储在列表中
-    #         # task_list = list(task_gen)
-    #
-    #         # 获取总的任务数量
-    #         total_tasks = len(task_list)
-    #
-    #         logger.success(f"TODO Task list total length: {total_tasks}")
-    #
-    #         # 创建tqdm进度条
-    #         progress_bar = tqdm(total=total_tasks, desc="Downloading", unit="file")
-    #
-    #         for res_entry in task_list:
-    #             # 提交下载任务到线程池
-    #             future = executor.submit(download_and_store, res_entry)
-    #
-    #             # 添加回调函数，以便在任务完成时更新进度条
-    #             future.add_done_callback(lambda p: progress_bar.update(1))
-    #
-    #         # 等待所有任务完成
-    #         executor.shutdown(wait=True)
-    #
-    #     # 关闭tqdm进度条
-    #     progress_bar.close()
-    #
-    #     task_description_dict = {}
-    #     task_description_dict.update(kwargs)
-    #     task_description_dict.update({'field': field,
-    #                                   'description': bulk_description,
-    #                                   'updated_time_range': [str(i) for i in
-    #                                                          updated_time_range] if updated_time_range else None})
-    #     task_description_dict.update({'download_history': download_history_dict})
-    #
-    #     logger.success(f'Retrieved {len(download_history_dict.keys())} entries.')
-    #     output_path = self.__raw_paper_storage_daily_path / f'download_history.json'
-    #     with open(output_path, 'w', encoding='utf-8') as f:
-    #         json.dump(task_description_dict, f, indent=4, ensure_ascii=False)
-    #     return output_path
+        # 关闭tqdm进度条
+        progress_bar.close()
+        logger.success(f"Task list total length: {produced_count[0]}")
+
+        download_history_dict = {}
+        for task_idx in sorted(download_records.keys()):
+            entry_id, record = download_records[task_idx]
+            download_history_dict[entry_id] = record
+        if failed_entries:
+            logger.warning(f"{len(failed_entries)} downloads failed: {list(failed_entries.keys())}")
+        return download_history_dict, failed_entries, search_complete[0]
 
     def download_by_arxiv_id(self, id_list, if_return_download=False, field=None, bulk_description=None,
                              updated_time_range=None,
                              **kwargs):
-        res = arxiv.Search(id_list=id_list)
-        client = arxiv.Client(
-            page_size=50,
-            delay_seconds=1.0,
-            num_retries=5
-        )
-        result_instance = client.results(res)
+        resolved_results = self.id_resolver.resolve(id_list)
+        download_history_dict, failed_entries, _ = self.download_pipeline(iter(resolved_results.values()))
         download_res = {}
-        download_history_dict = {}
-        for res_ins in result_instance:
-            try:
-                downloaded_path = self.download(res_ins)
-            except Exception as e:
-                logger.error(str(e))
-                continue
-            download_res[res_ins.entry_id.split('/')[-1]] = [downloaded_path, res_ins]
-            entry_dict = res_ins.__dict__
-            info_dict = {i: entry_dict[i] for i in entry_dict.keys() if i[0] != '_'}
-            download_history_dict[res_ins.entry_id] = {'downloaded_pdf_path': downloaded_path,
-                                                       'info': str(info_dict)}
-        task_description_dict = {}
-        task_description_dict.update({'field': field,
-                                      'description': bulk_description,
-                                      'updated_time_range': [str(i) for i in
-                                                             updated_time_range] if updated_time_range else None})
-        task_description_dict.update({'download_history': download_history_dict})
-        logger.success(f'Retrieved {len(download_history_dict.keys())} entries.')
+        for res_ins in resolved_results.values():
+            if res_ins.entry_id in download_history_dict:
+                download_res[res_ins.entry_id.split('/')[-1]] = \
+                    [download_history_dict[res_ins.entry_id]['downloaded_pdf_path'], res_ins]
         if if_return_download:
-            output_path = self.__raw_paper_storage_daily_path / f'download_history.json'
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(task_description_dict, f, indent=4, ensure_ascii=False)
-            return output_path
+            return self.dump_download_history(self.__raw_paper_storage_daily_path, download_history_dict,
+                                              field=field, bulk_description=bulk_description,
+                                              updated_time_range=updated_time_range,
+                                              failed_entries=failed_entries)
         return download_res
 
     def download_by_queries(self, summary_regex=None,
@@ -280,69 +319,102 @@ class PaperRetriever:
                             field=None,
                             **kwargs):
 
-        download_history_dict = {}
-
-        def download_and_store(res_entry):
-            try:
-                downloaded_path = self.download(res_entry)
-                entry_dict = res_entry.__dict__
-                info_dict = {i: entry_dict[i] for i in entry_dict.keys() if i[0] != '_'}
-
-                download_history_dict[res_entry.entry_id] = {'downloaded_pdf_path': downloaded_path,
-                                                             'info': str(info_dict)}
-                progress_bar.update(1)  # 更新进度条
-            except Exception as e:
-                logger.error(f'Error in download_and_store: {e}')
-                logger.debug(traceback.format_exc())
-
         task_gen = self.retrieve_topic_w_regex(summary_regex, title_regex, journal_ref_regex,
                                                target_subject_category,
                                                target_primary_category, updated_time_range, diy_query_str,
+                                               metadata_cache=self.metadata_cache,
+                                               client=self.search_client,
                                                **kwargs)
-        task_list = []
-        try:
-            for task in task_gen:
-                logger.info(f'{task} imported')
-                task_list.append(task)
-        except Exception as e:
-            logger.warning(str(e))
-
-        # 获取总的任务数量
-        total_tasks = len(task_list)
-
-        logger.success(f"TODO Task list total length: {total_tasks}")
-
-        # 创建tqdm进度条
-        progress_bar = tqdm(total=total_tasks, desc="Downloading", unit="file")
-
-        for res_entry in task_list:
-            # 提交下载任务到线程池
-            download_and_store(res_entry)
+        download_history_dict, failed_entries, search_complete = self.download_pipeline(task_gen)
 
-        # 关闭tqdm进度条
-        progress_bar.close()
+        return self.dump_download_history(self.__raw_paper_storage_daily_path, download_history_dict,
+                                          field=field, bulk_description=bulk_description,
+                                          updated_time_range=updated_time_range, failed_entries=failed_entries,
+                                          retrieval_complete=search_complete, **kwargs)
 
+    @staticmethod
+    def dump_download_history(batch_path: Path, download_history_dict, field=None, bulk_description=None,
+                              updated_time_range=None, failed_entries=None, retrieval_complete=True, **kwargs):
+        """
+        :param failed_entries: Dict of entry_id -> {'updated', 'error'} of the entries whose download failed.
+        :param retrieval_complete: False if the search stopped before it was exhausted.
+        """
         task_description_dict = {}
         task_description_dict.update(kwargs)
         task_description_dict.update({'field': field,
                                       'description': bulk_description,
                                       'updated_time_range': [str(i) for i in
                                                              updated_time_range] if updated_time_range else None})
-        task_description_dict.update({'download_history': download_history_dict})
+        task_description_dict.update({'download_history': download_history_dict,
+                                      'failed_entries': failed_entries or {},
+                                      'retrieval_complete': retrieval_complete})
 
         logger.success(f'Retrieved {len(download_history_dict.keys())} entries.')
-        output_path = self.__raw_paper_storage_daily_path / f'download_history.json'
+        output_path = batch_path / f'download_history.json'
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(task_description_dict, f, indent=4, ensure_ascii=False)
         return output_path
 
-    def __call__(self, *args, **kwargs):
+    def download_by_plan(self, field_args_dict: dict):
+        """
+        Run-level plan over several query options.
+        All searches feed one download pipeline deduplicated on entry_id, so a paper matching several fields is
+        downloaded once. Its record is then fanned out to the download history of every field it matched.
+        :param field_args_dict: Dict of field -> query args (as assembled by ArxivFlow.assemble_query_args).
+        :return: Dict of field -> download history path.
+        """
+        field_entry_ids = {field: [] for field in field_args_dict.keys()}
+        incomplete_fields = set()
+        planned_entry_ids = set()
+
+        def plan_gen():
+            for field, args in field_args_dict.items():
+                search_args = {k: v for k, v in args.items() if k not in ('field', 'bulk_description')}
+                try:
+                    for task in self.retrieve_topic_w_regex(metadata_cache=self.metadata_cache,
+                                                                client=self.search_client, **search_args):
+                        field_entry_ids[field].append(task.entry_id)
+                        if task.entry_id in planned_entry_ids:
+                            logger.info(f'[{field}] {task} already planned')
+                            continue
+                        planned_entry_ids.add(task.entry_id)
+                        yield task
+                except Exception as e:
+                    logger.warning(f'[{field}] Search stopped before it was exhausted: {str(e)}')
+                    incomplete_fields.add(field)
+
+        download_history_dict, failed_entries, _ = self.download_pipeline(plan_gen())
+        logger.success(f'Planned {len(planned_entry_ids)} unique entries for {len(field_args_dict)} fields.')
+
+        batch_ts = str(int(time.time()))
+        download_history_paths = {}
+        for field, args in field_args_dict.items():
+            batch_path = (self.__storage_path_base / str(datetime.now().strftime('%Y-%m-%d')) /
+                          self.sanitize_filename(f'batch_{batch_ts}_{field}'))
+            os.makedirs(batch_path, exist_ok=True)
+            field_history_dict = {entry_id: download_history_dict[entry_id] for entry_id in field_entry_ids[field]
+                                  if entry_id in download_history_dict}
+            field_failed_entries = {entry_id: failed_entries[entry_id] for entry_id in field_entry_ids[field]
+                                    if entry_id in failed_entries}
+            description_args = {k: v for k, v in args.items() if k not in ('field', 'bulk_description')}
+            download_history_paths[field] = self.dump_download_history(batch_path, field_history_dict,
+                                                                       field=args.get('field', field),
+                                                                       bulk_description=args.get('bulk_description'),
+                                                                       failed_entries=field_failed_entries,
+                                                                       retrieval_complete=field not in incomplete_fields,
+                                                                       **description_args)
+        return download_history_paths
+
+    def __call__(self, *args, backend=None, **kwargs):
         """
         Wrapper function.
         :param args:
+        :param backend: Optional retrieval backend for this and later calls, 'sync' or 'async'.
         :param kwargs:
         :return:
         """
+        if backend and backend != self.backend:
+            self.use_backend(backend)
         self.__raw_paper_storage_daily_path = (self.__storage_path_base / str(datetime.now().strftime('%Y-%m-%d')) /
                                                f'batch_{str(int(time.time()))}')
         os.makedirs(self.__raw_paper_storage_daily_path, exist_ok=True)
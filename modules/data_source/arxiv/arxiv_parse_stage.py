@@ -0,0 +1,162 @@
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from loguru import logger
+from tqdm import tqdm
+
+from modules.models import Paper
+from modules.models.paper_artifacts import PaperArtifactCache, get_file_checksum
+from modules.pdf_extract import parsePDFs_PDFFigures2
+
+
+def parse_paper_artifacts(task: dict):
+    """
+    Process pool worker. Parses one PDF into the on-disk artifact cache of Paper and returns a plain dict, the
+    parent process then builds a lazy Paper that loads the artifacts instead of parsing.
+    :param task: {'entry_id', 'pdf_path', 'title', 'checksum'}
+    :return: {'entry_id', 'status': 'ok' | 'error', 'checksum', 'error'}
+    """
+    res = {'entry_id': task['entry_id'], 'status': 'ok', 'checksum': task.get('checksum'), 'error': None}
+    paper_ins = None
+    try:
+        paper_ins = Paper(path=task['pdf_path'], url=task['entry_id'], title=task.get('title'),
+                          checksum=task.get('checksum'))
+        paper_ins.parse_pdf()
+        try:
+            paper_ins.get_section_titles(withlevel=True)
+        except Exception as e:
+            # Only used for figure placement, the paper is still usable.
+            logger.warning(f"No section titles for {task['entry_id']}: {str(e)}")
+        res['checksum'] = paper_ins.checksum
+    except Exception as e:
+        res.update({'status': 'error', 'error': f'{type(e).__name__}: {str(e)}'})
+        logger.debug(traceback.format_exc())
+    finally:
+        if paper_ins is not None:
+            paper_ins.clean_up()
+    return res
+
+
+class ParseStage:
+    """
+    Parallel PDF parse stage between download and summarization.
+    Tasks run on a process pool. If a worker dies (e.g. a segfault inside MuPDF) the pool breaks, so every task
+    left unfinished is rerun alone in its own single-process pool, which pins the crash on the PDF that caused it.
+    Figures of all parsed papers without stored pdffigures2 output are then extracted in one pdffigures2 run.
+    Papers whose structure is already in the artifact cache, or which the caller skips (e.g. already summarized),
+    are not parsed again. The process pool is created on first use and kept until close().
+    """
+
+    # Fields written by parse_paper_artifacts, a paper with all of them stored needs no parsing.
+    PARSED_FIELDS = ('raw_title', 'title_page', 'section_page_dict', 'section_body_dict')
+
+    def __init__(self, max_workers=None, extract_figures=True):
+        self.max_workers = max(1, int(max_workers if max_workers else (os.cpu_count() or 1)))
+        self.extract_figures = extract_figures
+        self.__executor = None
+
+    def get_executor(self):
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.__executor
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
+            self.__executor = None
+
+    @staticmethod
+    def get_artifact_cache(task):
+        return PaperArtifactCache(Path(task['pdf_path']).parent / '.artifacts')
+
+    def is_parsed(self, task):
+        stored_fields = self.get_artifact_cache(task).load(task['checksum'])
+        return all(field in stored_fields for field in self.PARSED_FIELDS)
+
+    def run_figure_batch(self, tasks, results):
+        pending = {}
+        for task in tasks:
+            parse_res = results.get(task['entry_id'], {})
+            if parse_res.get('status') != 'ok':
+                continue
+            artifact_cache = self.get_artifact_cache(task)
+            if 'PDFF2data' not in artifact_cache.load(parse_res['checksum']):
+                pending[parse_res['checksum']] = (task['pdf_path'], artifact_cache)
+        if not pending:
+            return
+        logger.info(f"Extract figures of {len(pending)} papers with pdffigures2.")
+        figure_data = parsePDFs_PDFFigures2({checksum: pending[checksum][0] for checksum in pending.keys()},
+                                            threads=self.max_workers)
+        for checksum, data in figure_data.items():
+            pending[checksum][1].store(checksum, {'PDFF2data': data})
+
+    @staticmethod
+    def run_isolated(task):
+        try:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                return executor.submit(parse_paper_artifacts, task).result()
+        except BrokenProcessPool as e:
+            return {'entry_id': task['entry_id'], 'status': 'error', 'checksum': task.get('checksum'),
+                    'error': f'Parser process crashed: {str(e)}'}
+
+    def __call__(self, tasks, skip=None):
+        """
+        :param tasks: List of task dicts, see parse_paper_artifacts.
+        :param skip: Optional predicate of a task, accepted tasks are not parsed.
+        :return: Dict of entry_id -> result dict.
+        """
+        results = {}
+        if not tasks:
+            return results
+        parse_tasks = []
+        for task in tasks:
+            try:
+                if not task.get('checksum'):
+                    task['checksum'] = get_file_checksum(task['pdf_path'])
+                if self.is_parsed(task) or (skip is not None and skip(task)):
+                    results[task['entry_id']] = {'entry_id': task['entry_id'], 'status': 'ok',
+                                                 'checksum': task['checksum'], 'error': None}
+                    continue
+            except Exception as e:
+                logger.debug(f"Parse check of {task['entry_id']} failed, parse it: {str(e)}")
+            parse_tasks.append(task)
+        if len(parse_tasks) < len(tasks):
+            logger.info(f"Skip parsing {len(tasks) - len(parse_tasks)} papers already parsed or summarized.")
+        if self.max_workers == 1 or len(parse_tasks) == 1:
+            for task in parse_tasks:
+                results[task['entry_id']] = parse_paper_artifacts(task)
+        elif parse_tasks:
+            results.update(self.run_pool(parse_tasks))
+        if self.extract_figures:
+            try:
+                self.run_figure_batch(tasks, results)
+            except Exception as e:
+                logger.warning(f"Figure batch failed, figures will be extracted per paper: {str(e)}")
+                logger.debug(traceback.format_exc())
+        return results
+
+    def run_pool(self, tasks):
+        results = {}
+        suspect_tasks = []
+        executor = self.get_executor()
+        future_task_dict = {executor.submit(parse_paper_artifacts, task): task for task in tasks}
+        for future in tqdm(future_task_dict, desc='Parsing PDFs'):
+            task = future_task_dict[future]
+            try:
+                results[task['entry_id']] = future.result()
+            except BrokenProcessPool:
+                suspect_tasks.append(task)
+        if suspect_tasks:
+            # A broken pool cannot take new tasks, the next run creates a new one.
+            self.__executor = None
+            executor.shutdown(wait=False)
+            logger.warning(f"Parser pool broken, rerun {len(suspect_tasks)} papers in isolated processes.")
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(suspect_tasks))) as executor:
+                for res in executor.map(self.run_isolated, suspect_tasks):
+                    results[res['entry_id']] = res
+        failed_count = len([i for i in results.values() if i['status'] != 'ok'])
+        logger.info(f"Parsed {len(results) - failed_count} papers, {failed_count} failed.")
+        return results
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import fitz
+from loguru import logger
+
+from .arxiv_downloader import ResumableDownloader
+
+
+class PdfStore:
+    """
+    PDF storage keyed by arXiv id and version (e.g. 2310.12345v2) instead of the sanitized title.
+    A sidecar JSON index records size, page count and checksum of every stored file, so a cache hit is an index
+    lookup plus a stat and a stored PDF never has to be opened again to be trusted.
+    register / remove append one line to a journal next to the index, flush() folds the journal into the index at
+    the end of a download batch, so a batch of N PDFs does not rewrite the index N times.
+    PyMuPDF is not thread safe, so register (called by the download workers) only checks the PDF header and trailer,
+    and flush() (called on the main thread after the batch) opens the new PDFs to fill in their page count.
+    """
+    INDEX_NAME = 'pdf_index.json'
+    JOURNAL_NAME = 'pdf_index.journal'
+
+    def __init__(self, root_path):
+        self.__root = Path(root_path)
+        os.makedirs(self.__root, exist_ok=True)
+        self.__index_path = self.__root / self.INDEX_NAME
+        self.__journal_path = self.__root / self.JOURNAL_NAME
+        self.__lock = threading.Lock()
+        self.__index = {}
+        if self.__index_path.exists():
+            try:
+                with open(self.__index_path, 'r', encoding='utf-8') as f:
+                    self.__index = json.load(f)
+            except Exception as e:
+                logger.warning(f"PDF index broken, will rebuild it: {str(e)}")
+        self.__replay_journal()
+
+    def __replay_journal(self):
+        """
+        Apply the journal left by a run that did not flush, e.g. a crash in the middle of a batch.
+        """
+        if not self.__journal_path.exists():
+            return
+        with open(self.__journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    # Last line of an interrupted write
+                    continue
+                if change.get('record') is None:
+                    self.__index.pop(change['key'], None)
+                else:
+                    self.__index[change['key']] = change['record']
+
+    @property
+    def root_path(self):
+        return self.__root
+
+    def __dump(self):
+        tmp_path = self.__index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.__index, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.__index_path)
+
+    def __append(self, key, record):
+        with open(self.__journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'key': key, 'record': record}, ensure_ascii=False) + '\n')
+
+    def fill_page_counts(self):
+        """
+        Open the registered PDFs whose page count is unknown yet. A PDF without pages is dropped from the index,
+        so it is downloaded again. Must be called from one thread only.
+        """
+        with self.__lock:
+            pending = {key: record for key, record in self.__index.items() if record.get('page_count') is None}
+        for key, record in pending.items():
+            pdf_path = self.__root / record['file_name']
+            try:
+                with fitz.open(pdf_path) as _pdf:
+                    page_count = _pdf.page_count
+            except Exception as e:
+                logger.warning(f"Failed to open {pdf_path}: {str(e)}")
+                page_count = 0
+            with self.__lock:
+                if self.__index.get(key) is not record:
+                    continue
+                if page_count <= 0:
+                    logger.warning(f"File broken, removed from index: {pdf_path}")
+                    self.__index.pop(key)
+                    self.__append(key, None)
+                    continue
+                record = dict(record, page_count=page_count)
+                self.__index[key] = record
+                self.__append(key, record)
+
+    def flush(self):
+        """
+        Fill in the page counts of the new PDFs, write the index with the journaled changes and clear the journal.
+        """
+        self.fill_page_counts()
+        with self.__lock:
+            if not self.__journal_path.exists():
+                return
+            self.__dump()
+            os.remove(self.__journal_path)
+
+    @staticmethod
+    def get_key(entry_id: str):
+        """
+        http://arxiv.org/abs/2310.12345v2 -> 2310.12345v2, http://arxiv.org/abs/hep-th/9901001v1 -> hep-th_9901001v1
+        """
+        return entry_id.split('/abs/')[-1].replace('/', '_')
+
+    def get_target_path(self, entry_id):
+        return self.__root / f'{self.get_key(entry_id)}.pdf'
+
+    @staticmethod
+    def get_checksum(pdf_path):
+        sha256 = hashlib.sha256()
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def get_record(self, entry_id):
+        with self.__lock:
+            return self.__index.get(self.get_key(entry_id))
+
+    def lookup(self, entry_id):
+        """
+        :param entry_id:
+        :return: Absolute path of the stored PDF, or None if it is not stored or the file changed on disk.
+        """
+        record = self.get_record(entry_id)
+        if not record:
+            return None
+        pdf_path = self.__root / record['file_name']
+        try:
+            if os.path.getsize(pdf_path) != record['size']:
+                return None
+        except OSError:
+            return None
+        return str(pdf_path.absolute())
+
+    def register(self, entry_id, pdf_path, title=None):
+        """
+        Validate pdf_path once and add it to the index. Its page count is filled in by the next flush().
+        :return: Index record.
+        """
+        pdf_path = Path(pdf_path)
+        ResumableDownloader.verify(pdf_path)
+        record = {'file_name': os.path.relpath(pdf_path, self.__root),
+                  'title': title,
+                  'size': os.path.getsize(pdf_path),
+                  'page_count': None,
+                  'sha256': self.get_checksum(pdf_path),
+                  'stored_at': datetime.now().isoformat()}
+        with self.__lock:
+            self.__index[self.get_key(entry_id)] = record
+            self.__append(self.get_key(entry_id), record)
+        logger.info(f"Registered {entry_id} at {pdf_path}.")
+        return record
+
+    def remove(self, entry_id):
+        with self.__lock:
+            if self.__index.pop(self.get_key(entry_id), None) is not None:
+                self.__append(self.get_key(entry_id), None)
@@ -0,0 +1,38 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    """
+    Per-host request spacing shared by every download thread.
+    arXiv asks automated clients to leave a fixed delay between consecutive requests to the same host,
+    no matter how many connections are open, so slots are handed out per host in arrival order.
+    """
+
+    def __init__(self, delay_seconds=3.0):
+        self.delay_seconds = delay_seconds
+        self.__lock = threading.Lock()
+        self.__next_slot = {}
+
+    @staticmethod
+    def get_host(url):
+        return urlparse(url).netloc.lower()
+
+    def reserve(self, url):
+        """
+        Reserve the next free slot for the host of url.
+        :param url:
+        :return: Seconds to wait before the request may be sent.
+        """
+        host = self.get_host(url)
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(now, self.__next_slot.get(host, now))
+            self.__next_slot[host] = slot + self.delay_seconds
+        return slot - now
+
+    def wait(self, url):
+        wait_seconds = self.reserve(url)
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
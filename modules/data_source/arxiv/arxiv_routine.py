@@ -1,13 +1,16 @@
+import json
 import time
 
 from modules.data_source.arxiv import PaperParser, PaperRetriever, BulkAnalysis
+from modules.data_source.arxiv.arxiv_watermark import WatermarkStore
 from modules import RawDataStorage
 from configs import CONFIG_DATA
-from modules.llm_utils import ChatModelLangchain
+from modules.llm_utils import ChatModelLangchain, LLMResponseCache, set_llm_response_cache, get_llm_response_cache
 from datetime import datetime
 from loguru import logger
 from pathlib import Path
 from modules.models.duration_utils import TIMEINTERVAL
+from modules.pdf_extract import set_java_path, set_render_cache_root, evict_render_cache
 import ssl
 
 # This restores the same behavior as before.
@@ -22,18 +25,72 @@ class ArxivFlow:
         # LLM
         llm_config_path = Path(CONFIG_DATA.get("LLM", {}).get("llm_config_path"))
         model_selected = CONFIG_DATA.get("LLM", {}).get("model_selected")
+        self.llm_platform = CONFIG_DATA.get("LLM", {}).get("platform", 'Zhipu')
+        # In-flight requests per provider, e.g. {Zhipu: 4}
+        self.llm_max_concurrency = (CONFIG_DATA.get("LLM", {}).get("max_concurrency") or {}).get(self.llm_platform, 1)
+        # Xmind nodes and keypoints of a paper from one LLM call
+        self.combined_structured_output = CONFIG_DATA.get("LLM", {}).get("combined_structured_output", True)
         # Storage
         storage_path_base = Path(CONFIG_DATA.get("Storage", {}).get("storage_path_base"))
         # DB related
         db_config_path = Path(CONFIG_DATA.get("DB", {}).get("config_path"))
         # Flow related params:
         target_language = CONFIG_DATA.get("Flow", {}).get("target_language")
+        self.incremental = bool(CONFIG_DATA.get("Flow", {}).get("incremental", False))
+        self.incremental_settle_hours = CONFIG_DATA.get("Flow", {}).get("incremental_settle_hours", 12)
+        # Download related params:
+        self.max_download_workers = CONFIG_DATA.get("Arxiv", {}).get("download_workers", 4)
+        self.download_delay_seconds = CONFIG_DATA.get("Arxiv", {}).get("download_delay_seconds", 3.0)
+        self.use_metadata_cache = CONFIG_DATA.get("Arxiv", {}).get("metadata_cache", True)
+        self.metadata_cache_settle_hours = CONFIG_DATA.get("Arxiv", {}).get("metadata_cache_settle_hours", 48)
+        self.retrieval_backend = CONFIG_DATA.get("Arxiv", {}).get("retrieval_backend", 'sync')
+        self.parse_workers = CONFIG_DATA.get("Arxiv", {}).get("parse_workers")
+        # Rendered figures are kept with the other artifacts of the storage path
+        render_cache_max_mb = CONFIG_DATA.get("Storage", {}).get("render_cache_max_mb", 2048)
+        render_cache_ttl_days = CONFIG_DATA.get("Storage", {}).get("render_cache_ttl_days", 30)
+        set_render_cache_root(storage_path_base / 'render_cache',
+                              max_disk_bytes=render_cache_max_mb * 1024 * 1024 if render_cache_max_mb else None,
+                              ttl_seconds=render_cache_ttl_days * 86400 if render_cache_ttl_days else None)
+        if CONFIG_DATA.get("Arxiv", {}).get("pdffigures2_java_path"):
+            set_java_path(CONFIG_DATA.get("Arxiv", {}).get("pdffigures2_java_path"))
+        # LLM response cache, shared by every predict call
+        response_cache_config = CONFIG_DATA.get("LLM", {}).get("response_cache") or {}
+        if response_cache_config.get("enabled", True):
+            cache_backend = response_cache_config.get("backend", 'sqlite')
+            default_cache_path = storage_path_base / ('llm_response_cache.sqlite3' if cache_backend == 'sqlite'
+                                                      else 'llm_response_cache')
+            ttl_hours = response_cache_config.get("ttl_hours")
+            set_llm_response_cache(LLMResponseCache(Path(response_cache_config.get("path") or default_cache_path),
+                                                    backend=cache_backend,
+                                                    ttl_seconds=ttl_hours * 3600 if ttl_hours else None,
+                                                    max_entries=response_cache_config.get("max_entries", 20000)))
         self.initialize_environment(llm_config_path=llm_config_path,
                                     db_config_path=db_config_path,
                                     model_selected=model_selected,
                                     target_language=target_language,
                                     storage_path=storage_path_base)
 
+    def close(self):
+        """
+        Release what the flow holds for its whole life, call it once the routines are done.
+        """
+        self.paper_analyzer.close()
+        self.paper_retriever.close()
+        removed_renders = evict_render_cache()
+        if removed_renders:
+            logger.info(f"Removed {removed_renders} rendered figures from the render cache.")
+        response_cache = get_llm_response_cache()
+        if response_cache is not None:
+            # 输出本次运行的缓存命中率
+            response_cache.close()
+            set_llm_response_cache(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     @staticmethod
     def assemble_query_args(startTS=None, endTS=None, query_arg_option=None, queries=None, id_list=None,
                             bulk_description=None, field=None):
@@ -69,12 +126,22 @@ class ArxivFlow:
     def initialize_environment(self, llm_config_path, db_config_path, model_selected, target_language, storage_path):
         logger.info("Starts to initialize environment")
         llm_engine_generator = ChatModelLangchain(config_yaml_path=llm_config_path)
-        self.llm_engine = llm_engine_generator.generate_llm_model('Zhipu', model_selected)
+        self.llm_engine = llm_engine_generator.generate_llm_model(self.llm_platform, model_selected)
         self.db_instance = RawDataStorage(db_config_path)
-        self.paper_retriever = PaperRetriever(db_instance=self.db_instance, storage_path=storage_path)
+        self.paper_retriever = PaperRetriever(db_instance=self.db_instance, storage_path=storage_path,
+                                              max_download_workers=self.max_download_workers,
+                                              download_delay_seconds=self.download_delay_seconds,
+                                              use_metadata_cache=self.use_metadata_cache,
+                                              metadata_cache_settle_hours=self.metadata_cache_settle_hours,
+                                              retrieval_backend=self.retrieval_backend)
         logger.info(f'Paper retriever storage base path set to : {storage_path}')
-        self.paper_parser = PaperParser(self.llm_engine, self.db_instance, target_language)
-        self.paper_analyzer = BulkAnalysis(self.llm_engine, self.db_instance, self.paper_parser, self.paper_retriever)
+        self.watermark_store = WatermarkStore(Path(storage_path) / 'watermarks.json',
+                                              settle_hours=self.incremental_settle_hours)
+        self.paper_parser = PaperParser(self.llm_engine, self.db_instance, target_language,
+                                        combined_structured_output=self.combined_structured_output)
+        self.paper_analyzer = BulkAnalysis(self.llm_engine, self.db_instance, self.paper_parser, self.paper_retriever,
+                                           parse_workers=self.parse_workers,
+                                           llm_max_concurrency=self.llm_max_concurrency)
         logger.success("Environment initialized.")
 
     def default_routine(self, zhihu_instance):
@@ -84,23 +151,61 @@ class ArxivFlow:
                                                              f"supported.")
         logger.debug(_time_interval_str)
         startTS, endTS = self.get_time_duration(_time_interval_str)
-        reports = {}
+        field_args_dict = {}
         for field in query_args_option:
-            args = self.assemble_query_args(startTS=startTS,
+            fetch_startTS = self.watermark_store.get_fetch_start(field, startTS) if self.incremental else startTS
+            args = self.assemble_query_args(startTS=fetch_startTS,
                                             endTS=endTS,
                                             query_arg_option=field,
                                             queries=None)
             logger.debug(args)
-            download_history_path = self.paper_retriever(**args)
-            workbook_path = self.paper_analyzer(download_history_path=download_history_path,
-                                                zhihu_instance=zhihu_instance)
-            if workbook_path:
-                logger.success(f"{str(args)} downloaded to {workbook_path}")
-                reports[field] = workbook_path
-            else:
-                logger.error(f"Cannot generate {field} report.")
+            field_args_dict[field] = dict(args)
+        # One plan for the whole run: every unique paper is downloaded, parsed and summarized once.
+        download_history_paths = self.paper_retriever.download_by_plan(field_args_dict)
+        if self.incremental:
+            download_history_paths = {field: self.watermark_store.merge_window(field, download_history_path,
+                                                                               startTS, endTS)
+                                      for field, download_history_path in download_history_paths.items()}
+        # 每篇论文最后用到它的field, 该field完成后关闭其PDF
+        last_field_dict = {}
+        for field, download_history_path in download_history_paths.items():
+            for entry_id in self.load_entry_ids(download_history_path):
+                last_field_dict[entry_id] = field
+        paper_pool = {}
+        reports = {}
+        try:
+            for field, download_history_path in download_history_paths.items():
+                workbook_path = self.paper_analyzer(download_history_path=download_history_path,
+                                                    zhihu_instance=zhihu_instance,
+                                                    paper_pool=paper_pool)
+                if workbook_path:
+                    logger.success(f"{str(field_args_dict[field])} downloaded to {workbook_path}")
+                    reports[field] = workbook_path
+                    if self.incremental:
+                        self.watermark_store.commit(field, self.paper_analyzer.last_processed_entry_ids)
+                else:
+                    logger.error(f"Cannot generate {field} report.")
+                self.release_papers(paper_pool, [i for i in paper_pool.keys() if last_field_dict.get(i) == field])
+        finally:
+            self.release_papers(paper_pool, list(paper_pool.keys()))
+            self.paper_parser.clear_summary_memo()
         return reports
 
+    @staticmethod
+    def load_entry_ids(download_history_path):
+        with open(download_history_path, 'r', encoding='utf-8') as f:
+            return list(json.load(f).get('download_history', {}).keys())
+
+    @staticmethod
+    def release_papers(paper_pool: dict, entry_ids):
+        """
+        Close the PDFs of entry_ids and drop them from paper_pool.
+        """
+        for entry_id in entry_ids:
+            paper = paper_pool.pop(entry_id, None)
+            if paper is not None:
+                paper.clean_up()
+
     def diy_routine(self, query_args_option=None, time_interval_str=None, time_duration=None, id_list=None,
                     queries=None, field=None, zhihu_instance=None, bulk_description=None):
         if query_args_option:
@@ -144,8 +249,8 @@ class ArxivFlow:
 
 if __name__ == "__main__":
     logger.info("Starts")
-    ins = ArxivFlow()
-    ins.default_routine()
+    with ArxivFlow() as ins:
+        ins.default_routine()
 
     while 1:
         current_datetime = datetime.now()
@@ -153,5 +258,5 @@ if __name__ == "__main__":
                                                  0, 0)
         if 5 > time_delta.seconds > 0:
             logger.info(f"Current time: {current_datetime}")
-            ins = ArxivFlow()
-            ins.default_routine()
+            with ArxivFlow() as ins:
+                ins.default_routine()
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from loguru import logger
+
+
+class WatermarkStore:
+    """
+    Per query option record of the newest `updated` timestamp already processed, plus a ledger of the
+    download history entries still inside the report window.
+    An incremental run only retrieves papers newer than the watermark and assembles the full window
+    report from the ledger, whose summaries are already cached in DB.
+    Fetches start settle_hours before the watermark, since arxiv may index an entry after newer ones were already
+    returned. Entries fetched twice are deduplicated by the ledger and their summaries are cached.
+    The failed downloads and whether the search was exhausted are kept from the latest merged run, so that commit
+    never moves the watermark over an entry that was not downloaded.
+    """
+
+    def __init__(self, store_path, settle_hours=12):
+        self.__store_path = Path(store_path)
+        self.settle = timedelta(hours=settle_hours or 0)
+        self.__lock = threading.Lock()
+        self.__data = {}
+        if self.__store_path.exists():
+            with open(self.__store_path, 'r', encoding='utf-8') as f:
+                self.__data = json.load(f)
+
+    def __dump(self):
+        os.makedirs(self.__store_path.parent, exist_ok=True)
+        tmp_path = self.__store_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.__data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.__store_path)
+
+    def get_watermark(self, field):
+        watermark = self.__data.get(field, {}).get('watermark')
+        return datetime.fromisoformat(watermark) if watermark else None
+
+    def get_fetch_start(self, field, startTS: datetime):
+        watermark = self.get_watermark(field)
+        if watermark and watermark - self.settle > startTS:
+            fetch_start = watermark - self.settle
+            logger.info(f"[{field}] Incremental mode: only fetch papers updated after {fetch_start} "
+                        f"(watermark {watermark}, settle window {self.settle})")
+            return fetch_start
+        return startTS
+
+    def merge_window(self, field, download_history_path: Path, startTS: datetime, endTS: datetime):
+        """
+        Add the newly downloaded entries to the ledger, drop the ones that left the window and rewrite
+        download_history_path so that it covers the whole window. The failed entries and the retrieval_complete
+        flag of the run replace the ones of the previous run.
+        :return: download_history_path
+        """
+        with open(download_history_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        new_history = data.get('download_history', {})
+        with self.__lock:
+            field_data = self.__data.setdefault(field, {'watermark': None, 'papers': {}})
+            field_data['failed'] = {entry_id: info['updated']
+                                    for entry_id, info in (data.get('failed_entries') or {}).items()}
+            field_data['retrieval_complete'] = data.get('retrieval_complete', True)
+            ledger = field_data['papers']
+            ledger.update(new_history)
+            for entry_id in [i for i in ledger.keys()
+                             if not ledger[i].get('updated')
+                             or datetime.fromisoformat(ledger[i]['updated']) <= startTS]:
+                ledger.pop(entry_id)
+            self.__dump()
+            merged_history = dict(sorted(ledger.items(), key=lambda x: x[1]['updated'], reverse=True))
+        logger.info(f"[{field}] {len(new_history)} new entries, {len(merged_history)} entries in window, "
+                    f"{len(field_data['failed'])} failed downloads.")
+        data['download_history'] = merged_history
+        data['updated_time_range'] = [str(startTS), str(endTS)]
+        with open(download_history_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        return download_history_path
+
+    def commit(self, field, processed_ids=None):
+        """
+        Move the watermark of field forward over the processed entries of its ledger. Called once the report is
+        generated.
+        :param processed_ids: Entry ids processed successfully, None for the whole ledger. The watermark stops
+        before the oldest entry not processed or not downloaded, so that one is fetched again by the next run.
+        The watermark is not moved at all if the search of the latest run was not exhausted.
+        """
+        with self.__lock:
+            field_data = self.__data.get(field)
+            if not field_data or not field_data['papers']:
+                return
+            if not field_data.get('retrieval_complete', True):
+                logger.warning(f"[{field}] Search of the latest run was not exhausted, watermark not moved.")
+                return
+            ledger = field_data['papers']
+            processed_ids = set(ledger.keys()) if processed_ids is None else set(processed_ids)
+            processed_ts = [datetime.fromisoformat(ledger[i]['updated']) for i in ledger.keys() if i in processed_ids]
+            pending_ts = [datetime.fromisoformat(ledger[i]['updated']) for i in ledger.keys()
+                          if i not in processed_ids]
+            pending_ts += [datetime.fromisoformat(updated) for entry_id, updated in field_data.get('failed', {}).items()
+                           if entry_id not in processed_ids]
+            if pending_ts:
+                logger.warning(f"[{field}] {len(pending_ts)} entries not downloaded or processed, watermark stops "
+                               f"before {min(pending_ts)}")
+                processed_ts = [i for i in processed_ts if i < min(pending_ts)]
+            watermark = self.get_watermark(field)
+            if not processed_ts or (watermark and max(processed_ts) <= watermark):
+                return
+            newest = max(processed_ts)
+            field_data['watermark'] = newest.isoformat()
+            self.__dump()
+        logger.success(f"[{field}] Watermark moved to {newest}")
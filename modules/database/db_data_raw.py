@@ -1,7 +1,12 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
 from modules.models.database import SingletonDatabase
 from modules.database.db_models import PaperSummaryResults
 from loguru import logger
 from pathlib import Path
+from sqlalchemy import inspect, text
 from sqlalchemy.sql.expression import exists
 from sqlalchemy.sql import func
 
@@ -11,8 +16,171 @@ class RawDataStorage(SingletonDatabase):
     Inheriting from SingletonDatabase.
     """
 
+    # Cached LLM results of a paper, prefetched together by prefetch_summaries
+    SUMMARY_COLUMNS = ('chinese_title', 'step1_brief_summary', 'step2_method_summary', 'step3_whole_paper_summary',
+                       'whole_summary_chinese', 'innovation_type', 'xmind_nodes', 'paper_keypoints')
+
     def __init__(self, db_config_path: Path):
         super().__init__(db_config_path)
+        self.__summary_lock = threading.RLock()
+        # entry_id -> {'idx': ..., column: value}, rows loaded by prefetch_summaries
+        self.__summary_rows = {}
+        # entry_id -> {'idx': ..., column: value}, writes buffered by summary_batch
+        self.__pending_updates = {}
+        # Depth of the nested summary_batch blocks, and the entries whose rows they hold
+        self.__batch_depth = 0
+        self.__batch_entry_ids = set()
+        self.flush_size = 50
+        self.summary_columns = self.check_summary_columns()
+
+    def check_summary_columns(self):
+        """
+        Add the summary columns missing in an existing table, as initialization.py does, so a deployment keeps
+        working before initialization.py is run again. Columns that cannot be added are left out: prefetch_summaries
+        does not select them, their get_* return None and their upload_* do nothing.
+        :return: Tuple of the usable summary columns.
+        """
+        table = PaperSummaryResults.__table__
+        try:
+            existing_columns = {column['name'] for column in
+                                inspect(self.engine).get_columns(table.name, schema=table.schema)}
+        except Exception as e:
+            logger.warning(f"Cannot inspect {table.schema}.{table.name}, assume every summary column exists: {str(e)}")
+            return self.SUMMARY_COLUMNS
+        for column_name in self.SUMMARY_COLUMNS:
+            if column_name in existing_columns:
+                continue
+            column_type = table.columns[column_name].type.compile(dialect=self.engine.dialect)
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE {table.schema}.{table.name} '
+                                            f'ADD COLUMN IF NOT EXISTS {column_name} {column_type}'))
+                existing_columns.add(column_name)
+                logger.info(f"Column '{column_name}' added to table '{table.name}'.")
+            except Exception as e:
+                logger.warning(f"Column '{column_name}' missing in table '{table.name}' and cannot be added, "
+                               f"run modules/database/initialization.py: {str(e)}")
+        return tuple(column for column in self.SUMMARY_COLUMNS if column in existing_columns)
+
+    def prefetch_summaries(self, entry_ids):
+        """
+        Load the summary columns of every entry_id in one query. Later get_* calls of these entries are answered
+        from memory, entries missing in the DB are remembered as missing.
+        """
+        entry_ids = [i for i in dict.fromkeys(entry_ids) if i]
+        if not entry_ids:
+            return
+        columns = [getattr(PaperSummaryResults, column) for column in self.summary_columns]
+        with self.session as session:
+            rows = session.query(PaperSummaryResults.entry_id, PaperSummaryResults.idx, *columns) \
+                .filter(PaperSummaryResults.entry_id.in_(entry_ids)).all()
+        with self.__summary_lock:
+            for entry_id in entry_ids:
+                self.__summary_rows[entry_id] = None
+            for row in rows:
+                self.__summary_rows[row[0]] = dict(zip(('idx',) + self.summary_columns, row[1:]))
+        logger.info(f"Prefetched summaries of {len(rows)}/{len(entry_ids)} papers.")
+
+    def flush_summaries(self):
+        """
+        Write the buffered summary columns back in one bulk update. A failed write is logged and its updates are
+        buffered again for the next flush, so it never raises into the paper whose upload triggered it.
+        :return: False if the write failed.
+        """
+        with self.__summary_lock:
+            pending_updates = self.__pending_updates
+            self.__pending_updates = {}
+        if not pending_updates:
+            return True
+        mappings = [{**values, 'last_modified_at': datetime.now(timezone.utc)} for values in pending_updates.values()]
+        session = self.session
+        try:
+            session.bulk_update_mappings(PaperSummaryResults, mappings)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            with self.__summary_lock:
+                for entry_id, values in pending_updates.items():
+                    # Values buffered during the failed write are newer
+                    self.__pending_updates[entry_id] = {**values, **self.__pending_updates.get(entry_id, {})}
+            logger.error(f"Failed to write back summaries of {len(mappings)} papers, kept for the next flush: "
+                         f"{str(e)}")
+            return False
+        finally:
+            session.close()
+        logger.info(f"Wrote back summaries of {len(mappings)} papers.")
+        return True
+
+    @contextmanager
+    def summary_batch(self, entry_ids):
+        """
+        Prefetch the summaries of entry_ids and buffer the summary uploads until the block exits (or flush_size papers
+        are pending), so a batch of papers costs a constant number of queries.
+        Blocks can be nested: the uploads are written back and the rows released when the outermost block exits, an
+        inner block only prefetches the entries not held yet.
+        """
+        entry_ids = [i for i in dict.fromkeys(entry_ids) if i]
+        with self.__summary_lock:
+            # Rows held by an outer block may carry updates not written back yet
+            new_entry_ids = [i for i in entry_ids if i not in self.__batch_entry_ids]
+        self.prefetch_summaries(new_entry_ids)
+        with self.__summary_lock:
+            self.__batch_depth += 1
+            self.__batch_entry_ids.update(entry_ids)
+        try:
+            yield self
+        finally:
+            with self.__summary_lock:
+                self.__batch_depth -= 1
+                outermost = self.__batch_depth == 0
+            if outermost:
+                self.flush_summaries()
+                with self.__summary_lock:
+                    if not self.__batch_depth:
+                        for entry_id in self.__batch_entry_ids:
+                            self.__summary_rows.pop(entry_id, None)
+                        self.__batch_entry_ids = set()
+
+    def _get_summary_column(self, entry_id, column):
+        if column not in self.summary_columns:
+            return None
+        with self.__summary_lock:
+            if entry_id in self.__summary_rows:
+                row = self.__summary_rows[entry_id]
+                return row[column] if row else None
+        with self.session as session:
+            return session.query(getattr(PaperSummaryResults, column)).filter_by(entry_id=entry_id).scalar()
+
+    def _upload_summary_column(self, entry_id, column, value):
+        self._upload_summary_columns(entry_id, {column: value})
+
+    def _upload_summary_columns(self, entry_id, values: dict):
+        values = {column: value for column, value in values.items() if column in self.summary_columns}
+        if not values:
+            return
+        buffered = need_flush = False
+        with self.__summary_lock:
+            if entry_id in self.__summary_rows:
+                row = self.__summary_rows[entry_id]
+                if not row:
+                    # Same as _entry_exists failing, nothing to update
+                    return
+                row.update(values)
+                if self.__batch_depth:
+                    self.__pending_updates.setdefault(entry_id, {'idx': row['idx']}).update(values)
+                    need_flush = len(self.__pending_updates) >= self.flush_size
+                    buffered = True
+        if buffered:
+            if need_flush:
+                self.flush_summaries()
+            return
+        with self.session as session:
+            if self._entry_exists(session, entry_id):
+                session.query(PaperSummaryResults).filter_by(entry_id=entry_id).update({
+                    **values,
+                    "last_modified_at": func.now()
+                })
+                session.commit()
 
     @staticmethod
     def _entry_exists(session, entry_id):
@@ -44,85 +212,58 @@ class RawDataStorage(SingletonDatabase):
                 session.commit()
 
     def upload_step1_brief_summary(self, entry_id, step1_brief_summary):
-        with self.session as session:
-            if self._entry_exists(session, entry_id):
-                session.query(PaperSummaryResults).filter_by(entry_id=entry_id).update({
-                    "step1_brief_summary": step1_brief_summary,
-                    "last_modified_at": func.now()
-                })
-                session.commit()
+        self._upload_summary_column(entry_id, 'step1_brief_summary', step1_brief_summary)
 
     def upload_step2_method_summary(self, entry_id, step2_method_summary):
-        with self.session as session:
-            if self._entry_exists(session, entry_id):
-                session.query(PaperSummaryResults).filter_by(entry_id=entry_id).update({
-                    "step2_method_summary": step2_method_summary,
-                    "last_modified_at": func.now()
-                })
-                session.commit()
+        self._upload_summary_column(entry_id, 'step2_method_summary', step2_method_summary)
 
     def upload_step3_whole_paper_summary(self, entry_id, step3_whole_paper_summary):
-        with self.session as session:
-            if self._entry_exists(session, entry_id):
-                session.query(PaperSummaryResults).filter_by(entry_id=entry_id).update({
-                    "step3_whole_paper_summary": step3_whole_paper_summary,
-                    "last_modified_at": func.now()
-                })
-                session.commit()
+        self._upload_summary_column(entry_id, 'step3_whole_paper_summary', step3_whole_paper_summary)
 
     def upload_whole_summary_chinese(self, entry_id, whole_summary_chinese):
-        with self.session as session:
-            if self._entry_exists(session, entry_id):
-                session.query(PaperSummaryResults).filter_by(entry_id=entry_id).update({
-                    "whole_summary_chinese": whole_summary_chinese,
-                    "last_modified_at": func.now()
-                })
-                session.commit()
+        # 思维导图节点和关键词由总结生成, 总结更新后一并清空
+        self._upload_summary_columns(entry_id, {'whole_summary_chinese': whole_summary_chinese,
+                                                'xmind_nodes': None,
+                                                'paper_keypoints': None})
 
     def upload_innovative_type(self, entry_id, innovation_type):
-        with self.session as session:
-            if self._entry_exists(session, entry_id):
-                session.query(PaperSummaryResults).filter_by(entry_id=entry_id).update({
-                    "innovation_type": innovation_type,
-                    "last_modified_at": func.now()
-                })
-                session.commit()
+        self._upload_summary_column(entry_id, 'innovation_type', innovation_type)
 
     def upload_chinese_title(self, entry_id, chinese_title):
-        with self.session as session:
-            if self._entry_exists(session, entry_id):
-                session.query(PaperSummaryResults).filter_by(entry_id=entry_id).update({
-                    "chinese_title": chinese_title,
-                    "last_modified_at": func.now()
-                })
-                session.commit()
+        self._upload_summary_column(entry_id, 'chinese_title', chinese_title)
+
+    def upload_xmind_nodes(self, entry_id, xmind_nodes):
+        """
+        :param xmind_nodes: XmindNodeList JSON string.
+        """
+        self._upload_summary_column(entry_id, 'xmind_nodes', xmind_nodes)
+
+    def upload_paper_keypoints(self, entry_id, paper_keypoints):
+        """
+        :param paper_keypoints: PaperKeypoints JSON string.
+        """
+        self._upload_summary_column(entry_id, 'paper_keypoints', paper_keypoints)
 
     def get_step1_summary(self, entry_id):
-        with self.session as session:
-            result = session.query(PaperSummaryResults.step1_brief_summary).filter_by(entry_id=entry_id).scalar()
-            return result
+        return self._get_summary_column(entry_id, 'step1_brief_summary')
 
     def get_step2_summary(self, entry_id):
-        with self.session as session:
-            result = session.query(PaperSummaryResults.step2_method_summary).filter_by(entry_id=entry_id).scalar()
-            return result
+        return self._get_summary_column(entry_id, 'step2_method_summary')
 
     def get_step3_summary(self, entry_id):
-        with self.session as session:
-            result = session.query(PaperSummaryResults.step3_whole_paper_summary).filter_by(entry_id=entry_id).scalar()
-            return result
+        return self._get_summary_column(entry_id, 'step3_whole_paper_summary')
 
     def get_whole_summary_chinese(self, entry_id):
-        with self.session as session:
-            result = session.query(PaperSummaryResults.whole_summary_chinese).filter_by(entry_id=entry_id).scalar()
-            return result
+        return self._get_summary_column(entry_id, 'whole_summary_chinese')
 
     def get_innovative_type(self, entry_id):
-        with self.session as session:
-            result = session.query(PaperSummaryResults.innovation_type).filter_by(entry_id=entry_id).scalar()
-            return result
+        return self._get_summary_column(entry_id, 'innovation_type')
 
     def get_chinese_title(self, entry_id):
-        with self.session as session:
-            result = session.query(PaperSummaryResults.chinese_title).filter_by(entry_id=entry_id).scalar()
-            return result
\ No newline at end of file
+        return self._get_summary_column(entry_id, 'chinese_title')
+
+    def get_xmind_nodes(self, entry_id):
+        return self._get_summary_column(entry_id, 'xmind_nodes')
+
+    def get_paper_keypoints(self, entry_id):
+        return self._get_summary_column(entry_id, 'paper_keypoints')
@@ -23,4 +23,6 @@ class PaperSummaryResults(Base):
     step2_method_summary = Column(String)
     step3_whole_paper_summary = Column(String)
     whole_summary_chinese = Column(String)
-    innovation_type = Column(String)
\ No newline at end of file
+    innovation_type = Column(String)
+    xmind_nodes = Column(String)
+    paper_keypoints = Column(String)
\ No newline at end of file
@@ -42,6 +42,13 @@ for table in all_tables:
     # if table_name in inspector.get_table_names(schema=schema):
     if table_name in inspector.get_table_names(schema=schema):
         logger.info(f"Table '{table_name}' already exists.")
+        # 为已存在的表补充新增的列
+        existing_columns = {column['name'] for column in inspector.get_columns(table_name, schema=schema)}
+        for column in table.__table__.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=engine.dialect)
+                engine.execute(f'ALTER TABLE {schema}.{table_name} ADD COLUMN IF NOT EXISTS {column.name} {column_type}')
+                logger.info(f"Column '{column.name}' added to table '{table_name}'.")
     else:
         try:
             # 创建表结构
@@ -1,2 +1,4 @@
 from .llm_chatmodel_langchain_based import ChatModelLangchain
-from .llm_general_request_based import LLMGeneral
\ No newline at end of file
+from .llm_general_request_based import LLMGeneral
+from .llm_response_cache import LLMResponseCache, set_llm_response_cache, get_llm_response_cache, \
+    validate_llm_response
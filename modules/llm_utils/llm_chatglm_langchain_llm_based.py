@@ -9,6 +9,8 @@ from langchain.pydantic_v1 import Field, root_validator
 import zhipuai
 import re
 
+from .llm_response_cache import cached_llm_call
+
 
 class NotRetryException(Exception):
     pass
@@ -132,28 +134,36 @@ class Zhipuai_LLM(LLM):
             .. code-block:: python
                 response = zhipuai_model("Tell me a joke.")
         """
-        if self.streaming:
-            completion = ""
-            for chunk in self._stream(prompt, stop, run_manager, **kwargs):
-                completion += chunk.text
-            return completion
-        params = self._convert_prompt_msg_params(prompt, **kwargs)
-        # print({**params})
-        response_payload = self.client.invoke(**params)
-        return response_payload["data"]["choices"][-1]["content"].strip('"').strip(" ")
+        def _invoke():
+            if self.streaming:
+                completion = ""
+                for chunk in self._stream(prompt, stop, run_manager, **kwargs):
+                    completion += chunk.text
+                return completion
+            params = self._convert_prompt_msg_params(prompt, **kwargs)
+            # print({**params})
+            response_payload = self.client.invoke(**params)
+            return response_payload["data"]["choices"][-1]["content"].strip('"').strip(" ")
+
+        # request_id只用于追踪, 不影响结果
+        params = {**{key: value for key, value in self._default_params.items() if key != 'request_id'}, **kwargs}
+        return cached_llm_call(self.model, prompt, _invoke, call='_call', stop=stop, **params)
 
     def predict(self, prompt, temperature=0.95, top_p=0.7):
-        response = zhipuai.model_api.invoke(
-            model=self.model,
-            prompt=prompt,
-            temperature=temperature,
-            top_p=top_p,
-        )
-        if not response:
-            raise NotRetryException(str(response))
-        if not response.get('success'):
-            raise NotRetryException(str(response))
-        return self.english_stringfy_string(eval(response['data']['choices'][0]['content']).strip())
+        def _invoke():
+            response = zhipuai.model_api.invoke(
+                model=self.model,
+                prompt=prompt,
+                temperature=temperature,
+                top_p=top_p,
+            )
+            if not response:
+                raise NotRetryException(str(response))
+            if not response.get('success'):
+                raise NotRetryException(str(response))
+            return self.english_stringfy_string(eval(response['data']['choices'][0]['content']).strip())
+
+        return cached_llm_call(self.model, prompt, _invoke, temperature=temperature, top_p=top_p)
 
     @staticmethod
     def english_stringfy_string(input):
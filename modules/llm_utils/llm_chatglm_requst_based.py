@@ -1,6 +1,9 @@
 import zhipuai
 import re
 
+from .llm_response_cache import cached_llm_call
+
+
 class NotRetryException(Exception):
     pass
 
@@ -11,17 +14,20 @@ class ChatglmWrapperLangchain:
         self.model_name = model_name
 
     def predict(self, prompt, temperature=0.95, top_p=0.7):
-        response = zhipuai.model_api.invoke(
-            model=self.model_name,
-            prompt=prompt,
-            temperature=temperature,
-            top_p=top_p,
-        )
-        if not response:
-            raise NotRetryException(str(response))
-        if not response.get('success'):
-            raise NotRetryException(str(response))
-        return self.english_stringfy_string(eval(response['data']['choices'][0]['content']).strip())
+        def _invoke():
+            response = zhipuai.model_api.invoke(
+                model=self.model_name,
+                prompt=prompt,
+                temperature=temperature,
+                top_p=top_p,
+            )
+            if not response:
+                raise NotRetryException(str(response))
+            if not response.get('success'):
+                raise NotRetryException(str(response))
+            return self.english_stringfy_string(eval(response['data']['choices'][0]['content']).strip())
+
+        return cached_llm_call(self.model_name, prompt, _invoke, temperature=temperature, top_p=top_p)
 
     @staticmethod
     def english_stringfy_string(input):
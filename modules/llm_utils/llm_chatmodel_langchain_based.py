@@ -4,6 +4,18 @@ import yaml
 from loguru import logger
 from .llm_chatglm_requst_based import ChatglmWrapperLangchain
 from .llm_chatglm_langchain_llm_based import Zhipuai_LLM
+from .llm_response_cache import cached_llm_call
+
+
+class CachedAzureChatOpenAI(AzureChatOpenAI):
+    """
+    AzureChatOpenAI whose predict goes through the LLM response cache, like Zhipuai_LLM.
+    """
+
+    def predict(self, text, *, stop=None, **kwargs):
+        return cached_llm_call(f'Azure:{self.deployment_name}', text,
+                               lambda: super(CachedAzureChatOpenAI, self).predict(text, stop=stop, **kwargs),
+                               temperature=self.temperature, stop=stop, **kwargs)
 
 
 class ChatModelLangchain:
@@ -36,7 +48,7 @@ class ChatModelLangchain:
         if platform == 'Azure':
             logger.debug(f"Model info: {__target_model_configs}")
             logger.debug(f"Model extra params: {kwargs}")
-            chat_model = AzureChatOpenAI(
+            chat_model = CachedAzureChatOpenAI(
                 openai_api_key=__account_info.get("api-key"),
                 openai_api_base=__account_info.get("endpoint"),
                 deployment_name=__target_model_configs.get("deployment", {}).get('deployment_id'),
@@ -10,6 +10,8 @@ from loguru import logger
 import tiktoken
 from retrying import retry
 
+from .llm_response_cache import get_llm_response_cache, get_llm_response_validator
+
 
 class ContentFilteredException(Exception):
     pass
@@ -170,6 +172,17 @@ class LLMGeneral:
         __request_data = {'messages': messages,
                           'temperature': temperature}
         __request_data.update(kwargs)
+        response_cache = get_llm_response_cache()
+        validate = get_llm_response_validator()
+        cache_key = response_cache.make_key(f'{self.platform}:{model}', messages, temperature=temperature,
+                                            **kwargs) if response_cache else None
+        if cache_key:
+            cached_response = response_cache.get(cache_key)
+            if cached_response is not None:
+                if response_cache.is_valid(cached_response[0], validate):
+                    res_content, usage, model = cached_response
+                    return res_content, usage, model
+                response_cache.backend.delete(cache_key)
         request_dict = {
             'url': f'{self.__account_info.get("endpoint", "")}openai/deployments/{__deployment_id}/chat/completions?api-version={__api_version}',
             'headers': {"api-key": self.__account_info.get("api-key", ''), "Content-Type": "application/json"},
@@ -191,6 +204,8 @@ class LLMGeneral:
             model = res_dict['model']
             creation_time = res_dict['created']
             self.usage_history.append((creation_time, model, usage['prompt_tokens'], usage['completion_tokens']))
+            if cache_key and response_cache.is_valid(res_content, validate):
+                response_cache.set(cache_key, [res_content, usage, model])
             return res_content, usage, model
         except KeyError:
             logger.error(f"Fail to submit message.")
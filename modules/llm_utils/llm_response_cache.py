@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from loguru import logger
+
+
+class SqliteCacheBackend:
+    """
+    One sqlite table, key -> JSON value with created and last access time.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        os.makedirs(self.db_path.parent, exist_ok=True)
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self.__lock:
+            self.__conn.execute('PRAGMA journal_mode=WAL')
+            self.__conn.execute('CREATE TABLE IF NOT EXISTS llm_responses ('
+                                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+            self.__conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed_at '
+                                'ON llm_responses (accessed_at)')
+            self.__conn.commit()
+
+    def get(self, key):
+        """
+        :return: (value JSON string, created_at) or None
+        """
+        with self.__lock:
+            row = self.__conn.execute('SELECT value, created_at FROM llm_responses WHERE key = ?', (key,)).fetchone()
+            if row:
+                self.__conn.execute('UPDATE llm_responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+                self.__conn.commit()
+            return row
+
+    def set(self, key, value):
+        now = time.time()
+        with self.__lock:
+            self.__conn.execute('INSERT OR REPLACE INTO llm_responses (key, value, created_at, accessed_at) '
+                                'VALUES (?, ?, ?, ?)', (key, value, now, now))
+            self.__conn.commit()
+
+    def delete(self, key):
+        with self.__lock:
+            self.__conn.execute('DELETE FROM llm_responses WHERE key = ?', (key,))
+            self.__conn.commit()
+
+    def evict(self, max_entries=None, expire_before=None):
+        """
+        Remove entries created before expire_before, then the least recently used ones above max_entries.
+        :return: Count of removed entries.
+        """
+        removed = 0
+        with self.__lock:
+            if expire_before is not None:
+                removed += self.__conn.execute('DELETE FROM llm_responses WHERE created_at < ?',
+                                               (expire_before,)).rowcount
+            if max_entries is not None:
+                removed += self.__conn.execute(
+                    'DELETE FROM llm_responses WHERE key IN (SELECT key FROM llm_responses '
+                    'ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)', (max_entries,)).rowcount
+            self.__conn.commit()
+        return removed
+
+    def __len__(self):
+        with self.__lock:
+            return self.__conn.execute('SELECT COUNT(*) FROM llm_responses').fetchone()[0]
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+
+class DiskCacheBackend:
+    """
+    One JSON file per key under <root>/<key[:2]>/, the file mtime is the last access time.
+    """
+
+    def __init__(self, root_path):
+        self.root_path = Path(root_path)
+        os.makedirs(self.root_path, exist_ok=True)
+
+    def get_path(self, key):
+        return self.root_path / key[:2] / f'{key}.json'
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            os.utime(path)
+            return data['value'], data['created_at']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key, value):
+        path = self.get_path(key)
+        os.makedirs(path.parent, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}_{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'value': value, 'created_at': time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self.get_path(key))
+        except OSError:
+            pass
+
+    def evict(self, max_entries=None, expire_before=None):
+        entries = []
+        for path in self.root_path.glob('*/*.json'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        removed = 0
+        kept = []
+        for accessed_at, path in entries:
+            if expire_before is not None:
+                cached = self.get_cached_created_at(path)
+                if cached is not None and cached < expire_before:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                    continue
+            kept.append((accessed_at, path))
+        if max_entries is not None and len(kept) > max_entries:
+            kept.sort(reverse=True)
+            for _, path in kept[max_entries:]:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def get_cached_created_at(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('created_at')
+        except (OSError, ValueError):
+            return None
+
+    def __len__(self):
+        return len(list(self.root_path.glob('*/*.json')))
+
+    def close(self):
+        pass
+
+
+class LLMResponseCache:
+    """
+    Content addressed cache of LLM responses, keyed by hash(model, prompt, sampling params).
+    Entries older than ttl_seconds are misses, the least recently used entries above max_entries are evicted every
+    evict_interval stores. Hit / miss counts are kept in self.metrics.
+    """
+
+    BACKENDS = {'sqlite': SqliteCacheBackend, 'disk': DiskCacheBackend}
+
+    def __init__(self, path, backend='sqlite', ttl_seconds=None, max_entries=20000, evict_interval=100):
+        """
+        :param path: sqlite file (sqlite backend) or directory (disk backend).
+        :param backend: sqlite or disk.
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"LLM response cache backend {backend} not supported, use one of {list(self.BACKENDS)}")
+        self.backend = self.BACKENDS[backend](path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_interval = max(1, int(evict_interval))
+        self.metrics = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'invalid': 0}
+        self.__lock = threading.Lock()
+        self.__stores_since_evict = 0
+
+    @staticmethod
+    def make_key(model, prompt, **params):
+        """
+        :param prompt: Prompt string or chat messages.
+        :param params: Sampling params (temperature, top_p, ...), None values are ignored.
+        """
+        payload = {'model': model, 'prompt': prompt,
+                   'params': {key: value for key, value in params.items() if value is not None}}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+                              .encode('utf-8')).hexdigest()
+
+    def __count(self, metric, count=1):
+        with self.__lock:
+            self.metrics[metric] += count
+
+    def get(self, key):
+        """
+        :return: Cached response or None.
+        """
+        try:
+            row = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"LLM response cache read failed: {str(e)}")
+            row = None
+        if row and self.ttl_seconds and row[1] < time.time() - self.ttl_seconds:
+            self.backend.delete(key)
+            row = None
+        if not row:
+            self.__count('misses')
+            return None
+        self.__count('hits')
+        return json.loads(row[0])
+
+    def set(self, key, response):
+        try:
+            self.backend.set(key, json.dumps(response, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"LLM response cache write failed: {str(e)}")
+            return
+        self.__count('stores')
+        with self.__lock:
+            self.__stores_since_evict += 1
+            need_evict = self.__stores_since_evict >= self.evict_interval
+            if need_evict:
+                self.__stores_since_evict = 0
+        if need_evict:
+            self.evict()
+
+    def evict(self):
+        expire_before = time.time() - self.ttl_seconds if self.ttl_seconds else None
+        removed = self.backend.evict(max_entries=self.max_entries, expire_before=expire_before)
+        self.__count('evictions', removed)
+        return removed
+
+    def is_valid(self, response, validate=None):
+        """
+        :param validate: Callable raising on a response its caller cannot use, e.g. an output parser.
+        """
+        if validate is None:
+            return True
+        try:
+            validate(response)
+        except Exception as e:
+            logger.debug(f"LLM response not cached, validation failed: {str(e)}")
+            self.__count('invalid')
+            return False
+        return True
+
+    def cached_call(self, model, prompt, compute, validate=None, **params):
+        """
+        Return the cached response of (model, prompt, params), or compute() and cache its result.
+        Exceptions of compute and responses failing validate are not cached, a cached response failing validate is
+        dropped and computed again.
+        """
+        key = self.make_key(model, prompt, **params)
+        response = self.get(key)
+        if response is not None:
+            if self.is_valid(response, validate):
+                return response
+            self.backend.delete(key)
+        response = compute()
+        if response is not None and self.is_valid(response, validate):
+            self.set(key, response)
+        return response
+
+    def get_hit_rate(self):
+        total = self.metrics['hits'] + self.metrics['misses']
+        return self.metrics['hits'] / total if total else 0
+
+    def close(self):
+        logger.info(f"LLM response cache metrics: {self.metrics}, hit rate {self.get_hit_rate():.2%}")
+        self.backend.close()
+
+
+_DEFAULT_CACHE = None
+_VALIDATION = threading.local()
+
+
+def set_llm_response_cache(cache: LLMResponseCache = None):
+    """
+    Set the cache used by every predict / chat_completion call, None disables caching.
+    """
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = cache
+
+
+def get_llm_response_cache():
+    return _DEFAULT_CACHE
+
+
+@contextmanager
+def validate_llm_response(validate):
+    """
+    Responses of the predict calls of this thread within the block are cached only if validate(response) does not
+    raise, so a retry after a parse failure asks the model again instead of reading the same bad text.
+    """
+    previous = getattr(_VALIDATION, 'validate', None)
+    _VALIDATION.validate = validate
+    try:
+        yield
+    finally:
+        _VALIDATION.validate = previous
+
+
+def get_llm_response_validator():
+    return getattr(_VALIDATION, 'validate', None)
+
+
+def cached_llm_call(model, prompt, compute, **params):
+    """
+    compute() through the default cache, or directly if no cache is set.
+    """
+    cache = get_llm_response_cache()
+    if cache is None:
+        return compute()
+    return cache.cached_call(model, prompt, compute, validate=get_llm_response_validator(), **params)
@@ -1,2 +1,2 @@
 from .paper import Paper
-from .output_parser import XmindNodeList, PaperKeypoints
\ No newline at end of file
+from .output_parser import XmindNodeList, PaperKeypoints, PaperXmindDigest, parse_paper_xmind_digest
\ No newline at end of file
@@ -1,3 +1,5 @@
+import threading
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from pathlib import Path
@@ -43,4 +45,20 @@ class SingletonDatabase(metaclass=SingletonMeta):
         db_url = f"postgresql://{encoded_username}:{encoded_password}@{db_host}:{db_port}/{db_name}"
         self.engine = create_engine(db_url)
         self.Session = sessionmaker(bind=self.engine)
-        self.session = self.Session()
\ No newline at end of file
+        self.__local = threading.local()
+
+    @property
+    def session(self):
+        # Session不能跨线程共用, 每个线程各自一个
+        if getattr(self.__local, 'session', None) is None:
+            self.__local.session = self.Session()
+        return self.__local.session
+
+    def remove_session(self):
+        """
+        Close and drop the Session of the calling thread, worker threads call it when they finish.
+        """
+        session = getattr(self.__local, 'session', None)
+        if session is not None:
+            session.close()
+            self.__local.session = None
@@ -1,6 +1,10 @@
 # encoding=utf-8
+import json
+import re
+
 from langchain.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
+from langchain.schema import OutputParserException
+from pydantic import BaseModel, Field, ValidationError
 from typing import List
 
 
@@ -26,6 +30,142 @@ class PaperKeypoints(BaseModel):
     )
 
 
+class PaperXmindDigest(BaseModel):
+    NodeList: List[XmindNode] = Field(
+        description='思维导图的节点列表'
+    )
+    keypoints: List[str] = Field(
+        description='论文关键词的列表'
+    )
+
+
+def _scan_json(text):
+    """
+    :return: (closers of the open containers, start of the open string or None, structural cut positions and
+    trailing comma positions outside strings)
+    """
+    stack = []
+    cut_positions = []
+    trailing_commas = []
+    string_start = None
+    escaped = False
+    last_comma = None
+    for i, char in enumerate(text):
+        if string_start is not None:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                string_start = None
+            continue
+        if char.isspace():
+            continue
+        if char in '}]' and last_comma is not None:
+            trailing_commas.append(last_comma)
+        last_comma = None
+        if char == '"':
+            string_start = i
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            cut_positions.append(i + 1)
+        elif char in '}]':
+            if stack:
+                stack.pop()
+        elif char == ',':
+            cut_positions.append(i)
+            last_comma = i
+    return stack, string_start, cut_positions, trailing_commas
+
+
+def _strip_trailing_commas(text):
+    """
+    Remove the commas right before a closing bracket, commas inside strings are kept.
+    """
+    _, _, _, trailing_commas = _scan_json(text)
+    for i in reversed(trailing_commas):
+        text = text[:i] + text[i + 1:]
+    return text
+
+
+def _close_json(text):
+    stack, string_start, cut_positions, _ = _scan_json(text)
+    if string_start is not None:
+        # 截断在字符串中: 丢弃该元素, 不保留半截的值
+        text = text[:max([i for i in cut_positions if i <= string_start], default=0)]
+        stack, _, _, _ = _scan_json(text)
+    text = re.sub(r'[\s,]*$', '', text)
+    # 截断在key之后: 去掉 "key":
+    text = re.sub(r',?\s*"[^"]*"\s*:$', '', text)
+    return text + ''.join(reversed(stack))
+
+
+def repair_json_output(text: str, max_cuts=20):
+    """
+    Parse the JSON object in an LLM output, repairing small format slips instead of failing:
+    code fences and text around the object, trailing commas, and output truncated in the middle (open containers
+    are closed, an element cut inside a string or an unparsable tail is dropped back to the previous element).
+
+    :return: dict
+    """
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', text, re.S)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find('{')
+    if start < 0:
+        raise OutputParserException(f"No JSON object in output: {text}")
+    text = text[start:]
+    decoder = json.JSONDecoder()
+    try:
+        return decoder.raw_decode(text)[0]
+    except ValueError:
+        pass
+    text = _strip_trailing_commas(text)
+    for _ in range(max_cuts):
+        try:
+            res = decoder.raw_decode(_close_json(text))[0]
+            if isinstance(res, dict):
+                return res
+        except ValueError:
+            pass
+        _, _, cut_positions, _ = _scan_json(text)
+        cut_positions = [i for i in cut_positions if i < len(text)]
+        if not cut_positions:
+            break
+        text = text[:cut_positions[-1]]
+    raise OutputParserException(f"Cannot repair JSON output: {text}")
+
+
+def _flatten_node_value(value):
+    # 模型有时以对象或列表返回节点值, 每项一行
+    if isinstance(value, dict):
+        return '\n'.join(f'{key}: {_flatten_node_value(val)}' for key, val in value.items())
+    if isinstance(value, list):
+        return '\n'.join(_flatten_node_value(val) for val in value)
+    return str(value)
+
+
+def parse_paper_xmind_digest(text: str) -> PaperXmindDigest:
+    """
+    Parse PaperXmindDigest from an LLM output with per-field fallback: invalid nodes or keypoints are dropped
+    instead of failing the whole output. Only raise OutputParserException if neither field has a valid item.
+    """
+    data = repair_json_output(text)
+    nodes = []
+    for item in data.get('NodeList') or []:
+        if isinstance(item, dict) and isinstance(item.get('node_value'), (dict, list, int, float)):
+            item = {**item, 'node_value': _flatten_node_value(item['node_value'])}
+        try:
+            nodes.append(XmindNode.model_validate(item))
+        except ValidationError:
+            continue
+    keypoints = [str(i).strip() for i in data.get('keypoints') or []
+                 if isinstance(i, (str, int, float)) and str(i).strip()]
+    if not nodes and not keypoints:
+        raise OutputParserException(f"No valid NodeList or keypoints in output: {text}")
+    return PaperXmindDigest(NodeList=nodes, keypoints=keypoints)
+
+
 if __name__ == "__main__":
     parser = PydanticOutputParser(pydantic_object=XmindNodeList)
     print(parser.get_format_instructions())
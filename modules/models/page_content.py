@@ -0,0 +1,74 @@
+import threading
+
+import fitz
+
+from modules.pdf_extract import getDocumentColumnLayout
+
+
+class PageContent:
+    """
+    Per document page cache shared by every Paper method.
+    The plain text and the block dict of a page are extracted at most once, on first access. The document is
+    opened on demand and may be closed at any time, extracted content stays cached.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__pdf = None
+        self.__lock = threading.RLock()
+        self.__page_count = None
+        self.__texts = {}
+        self.__blocks = {}
+        self.__column_layout = None
+
+    @property
+    def pdf(self):
+        with self.__lock:
+            if self.__pdf is None or self.__pdf.is_closed:
+                self.__pdf = fitz.open(self.path)
+            return self.__pdf
+
+    @property
+    def page_count(self):
+        if self.__page_count is None:
+            self.__page_count = self.pdf.page_count
+        return self.__page_count
+
+    def get_text(self, page_index):
+        """
+        :return: page.get_text() of page_index.
+        """
+        with self.__lock:
+            if page_index not in self.__texts:
+                self.__texts[page_index] = self.pdf[page_index].get_text()
+            return self.__texts[page_index]
+
+    def get_blocks(self, page_index):
+        """
+        :return: page.get_text("dict", flags=0)["blocks"] of page_index, text blocks only.
+        """
+        with self.__lock:
+            if page_index not in self.__blocks:
+                self.__blocks[page_index] = self.pdf[page_index].get_text("dict", flags=0)["blocks"]
+            return self.__blocks[page_index]
+
+    @property
+    def column_layout(self):
+        """
+        :return: Column x ranges of every page, detected once for the whole document (see getDocumentColumnLayout).
+        """
+        with self.__lock:
+            if self.__column_layout is None:
+                self.__column_layout = getDocumentColumnLayout(
+                    self.pdf, [self.get_blocks(page_index) for page_index in range(self.page_count)])
+            return self.__column_layout
+
+    @property
+    def text_list(self):
+        return [self.get_text(page_index) for page_index in range(self.page_count)]
+
+    def close(self):
+        with self.__lock:
+            if self.__pdf is not None and not self.__pdf.is_closed:
+                self.__pdf.close()
+            self.__pdf = None
@@ -1,12 +1,43 @@
+import bisect
 import fitz, io, os
+from pathlib import Path
+from functools import cached_property
 from PIL import Image
 from loguru import logger
 import re
 from modules.pdf_extract import *
+from .page_content import PageContent
+from .paper_artifacts import PaperArtifactCache, get_file_checksum
+
+# 需要寻找的章节名称列表
+SECTION_NAME_LIST = ["Abstract",
+                     'Introduction', 'Related Work', 'Background',
+                     "Preliminary", "Problem Formulation",
+                     'Methods', 'Methodology', "Method", 'Approach', 'Approaches',
+                     # exp
+                     "Materials and Methods", "Experiment Settings",
+                     'Experiment', "Experimental Results", "Evaluation", "Experiments",
+                     "Results", 'Findings', 'Data Analysis',
+                     "Discussion", "Results and Discussion", "Conclusion",
+                     'References']
+# 章节需以"章节名\n"或"章节名大写\n"形式出现, "Abstract"出现即可
+SECTION_HEADING_NAME_DICT = {"Abstract": "Abstract", "ABSTRACT\n": "Abstract"}
+for _section_name in SECTION_NAME_LIST[1:]:
+    SECTION_HEADING_NAME_DICT[_section_name + '\n'] = _section_name
+    SECTION_HEADING_NAME_DICT[_section_name.upper() + '\n'] = _section_name
+# 零宽前瞻匹配每个位置, 互相包含的标题(如"Experimental Results\n"与"Results\n")都能被找到
+SECTION_HEADING_PATTERN = re.compile('(?=(' + '|'.join(
+    re.escape(i) for i in sorted(SECTION_HEADING_NAME_DICT, key=len, reverse=True)) + '))')
 
 
 class Paper:
-    def __init__(self, path, title=None, url=None, abs=None, authers=None):
+    """
+    PDF论文对象. 只在构造时校验页数, 标题识别, 段落划分, 参考文献和pdffigures2图表均在首次访问时计算,
+    因此总结已全部缓存在DB中的论文几乎没有解析开销.
+    解析结果按PDF checksum和解析器版本存于<pdf目录>/.artifacts, 同一PDF再次处理时直接读取.
+    """
+
+    def __init__(self, path, title=None, url=None, abs=None, authers=None, checksum=None, use_artifact_cache=True):
         # 初始化函数，根据pdf路径初始化Paper对象
         self.url = url if url else ''  # 文章链接
         self.path = path  # pdf路径
@@ -14,45 +45,134 @@ class Paper:
         self.section_texts = {}  # 段落内容
         self.abs = abs if abs else ""
         self.title_page = 0
-        if not title:
-            self.pdf = fitz.open(self.path)  # pdf文档
-            self.title = self.get_title()
-            self.parse_pdf()
-        else:
-            self.title = title
-            self.parse_pdf()
-        if not self.title or len(self.title) >= 100:
-            self.title = '.'.join(list(os.path.basename(path).split('.'))[:-1])
+        self.page_content = PageContent(path)
+        self.__given_title = title
+        self.__section_titles = None
+        self.__section_textposdict = None
+        self.__checksum = checksum
+        self.artifact_cache = PaperArtifactCache(Path(path).parent / '.artifacts') if use_artifact_cache else None
         self.authers = authers if authers else []
         self.roman_num = ["I", "II", 'III', "IV", "V", "VI", "VII", "VIII", "IIX", "IX", "X"]
         self.digit_num = [str(d + 1) for d in range(10)]
         self.first_image = ''
-        self.pdf.close()
-        self.PDFF2data = parsePDF_PDFFigures2(path)
-        self.pdf = fitz.open(self.path)
+        if self.page_content.page_count == 0:
+            logger.error(f"File is broken: {self.path}")
+            self.clean_up()
+            raise Exception("File broken.")
+
+    @property
+    def checksum(self):
+        if self.__checksum is None:
+            self.__checksum = get_file_checksum(self.path)
+        return self.__checksum
+
+    @cached_property
+    def artifacts(self):
+        return self.artifact_cache.load(self.checksum) if self.artifact_cache else {}
+
+    def _get_artifact(self, key, compute, should_store=bool):
+        """
+        Stored artifact of key, or compute() stored for the next time.
+        :param should_store: Results failing it (e.g. an empty failed pdffigures2 output) are not stored.
+        """
+        if key in self.artifacts:
+            return self.artifacts[key]
+        value = compute()
+        if self.artifact_cache and should_store(value):
+            self.artifacts[key] = value
+            self.artifact_cache.store(self.checksum, {key: value})
+        return value
+
+    @cached_property
+    def raw_title(self):
+        # 传入的标题或识别出的标题 (文件名回退前)
+        if self.__given_title:
+            return self.__given_title
+        if 'raw_title' in self.artifacts and 'title_page' in self.artifacts:
+            self.title_page = self.artifacts['title_page']
+            return self.artifacts['raw_title']
+        raw_title = self.get_title()
+        if self.artifact_cache:
+            self.artifacts.update({'raw_title': raw_title, 'title_page': self.title_page})
+            self.artifact_cache.store(self.checksum, {'raw_title': raw_title, 'title_page': self.title_page})
+        return raw_title
+
+    @cached_property
+    def title(self):
+        title = self.raw_title
+        # Only a detected title falls back to the file name, PDFs are stored by arXiv id.
+        if not title or (not self.__given_title and len(title) >= 100):
+            title = '.'.join(list(os.path.basename(self.path).split('.'))[:-1])
+        return title
+
+    @cached_property
+    def text_list(self):
+        return self.page_content.text_list
+
+    @cached_property
+    def all_text(self):
+        return ' '.join(self.text_list)
+
+    @cached_property
+    def section_page_dict(self):
+        section_page_dict = self._get_artifact('section_page_dict', self._get_all_page_index,
+                                               should_store=lambda x: True)  # 段落与页码的对应字典
+        logger.debug(f"section_page_dict: {section_page_dict}")
+        return section_page_dict
+
+    @cached_property
+    def section_text_dict(self):
+        # 标题识别会更新title_page, 需先于paper_info
+        raw_title = self.raw_title
+        if self.abs:
+            section_text_dict = self._get_all_page()  # 段落与内容的对应字典
+        else:
+            section_text_dict = dict(self._get_artifact('section_body_dict', self._get_all_page,
+                                                        should_store=lambda x: True))
+        section_text_dict.update({"title": raw_title})
+        # get_paper_info读取section_text_dict, 先写入实例避免递归
+        self.section_text_dict = section_text_dict
+        section_text_dict.update({"paper_info": self.get_paper_info()})
+        return section_text_dict
+
+    @cached_property
+    def reference_list(self):
+        return self.get_reference()
+
+    @cached_property
+    def PDFF2data(self):
+        return self._get_artifact('PDFF2data', lambda: parsePDF_PDFFigures2(self.path))
+
+    @property
+    def pdf(self):
+        # pdf文档, 与页面缓存共用, 关闭后按需重新打开
+        return self.page_content.pdf
 
     def clean_up(self):
         logger.info("PDF CLOSED")
-        self.pdf.close()
+        self.page_content.close()
 
     def parse_pdf(self):
-        self.pdf = fitz.open(self.path)  # pdf文档
-        if self.pdf.page_count == 0:
-            logger.error(f"File is broken: {self.title}")
-            self.clean_up()
-            raise Exception("File broken.")
-        self.text_list = [page.get_text() for page in self.pdf]
-        self.all_text = ' '.join(self.text_list)
-        self.section_page_dict = self._get_all_page_index()  # 段落与页码的对应字典
-        logger.debug(f"section_page_dict: {self.section_page_dict}")
-        self.section_text_dict = self._get_all_page()  # 段落与内容的对应字典
-        self.section_text_dict.update({"title": self.title})
-        self.section_text_dict.update({"paper_info": self.get_paper_info()})
-        self.reference_list = self.get_reference()
+        """
+        立即完成全部文本解析 (标题, 段落, 参考文献).
+        """
+        _ = self.section_text_dict
+        _ = self.reference_list
+        return self
 
+    def load_summary_text(self, with_sections=True):
+        """
+        在当前线程完成总结所需的PDF读取 (标题, 段落页码, 段落内容与paper_info).
+        PyMuPDF不支持多线程, 之后其他线程只读取已缓存的Python数据.
+        """
+        _ = self.title
+        if with_sections:
+            _ = self.section_page_dict
+            _ = self.section_text_dict
+        return self
 
     def get_paper_info(self):
-        first_page_text = self.pdf[self.title_page].get_text()
+        first_page_text = self.page_content.get_text(self.title_page)
         if "Abstract" in self.section_text_dict.keys():
             abstract_text = self.section_text_dict['Abstract']
         else:
@@ -68,8 +188,6 @@ class Paper:
         :return:
         """
         import time
-        # open file
-        self.pdf = fitz.open(self.path)  # pdf文档
         max_size = 0
         with fitz.Document(self.path) as my_pdf_file:
             # 遍历所有页面
@@ -123,9 +241,7 @@ class Paper:
 
     # 定义一个函数，根据字体的大小，识别每个章节名称，并返回一个列表
     def get_chapter_names(self, ):
-        # # 打开一个pdf文件
-        doc = fitz.open(self.path)  # pdf文档
-        text_list = [page.get_text() for page in doc]
+        text_list = self.page_content.text_list
         all_text = ''
         for text in text_list:
             all_text += text
@@ -150,13 +266,11 @@ class Paper:
         return chapter_names
 
     def get_title(self):
-        doc = self.pdf  # 打开pdf文件
         max_font_size = 0  # 初始化最大字体大小为0
         # max_string = ""  # 初始化最大字体大小对应的字符串为空
         max_font_sizes = [0]
-        for page_index, page in enumerate(doc):  # 遍历每一页
-            text = page.get_text("dict")  # 获取页面上的文本信息
-            blocks = text["blocks"]  # 获取文本块列表
+        for page_index in range(self.page_content.page_count):  # 遍历每一页
+            blocks = self.page_content.get_blocks(page_index)  # 获取文本块列表
             for block in blocks:  # 遍历每个文本块
                 if block["type"] == 0 and len(block['lines']):  # 如果是文字类型
                     if len(block["lines"][0]["spans"]):
@@ -169,9 +283,8 @@ class Paper:
         self.font_sizes_list = max_font_sizes
         logger.debug(f"max_font_sizes {max_font_sizes[-10:]}")
         cur_title = ''
-        for page_index, page in enumerate(doc):  # 遍历每一页
-            text = page.get_text("dict")  # 获取页面上的文本信息
-            blocks = text["blocks"]  # 获取文本块列表
+        for page_index in range(self.page_content.page_count):  # 遍历每一页
+            blocks = self.page_content.get_blocks(page_index)  # 获取文本块列表
             for block in blocks:  # 遍历每个文本块
                 if block["type"] == 0 and len(block['lines']):  # 如果是文字类型
                     for line in block['lines']:
@@ -230,105 +343,73 @@ class Paper:
         if reference_page_idx is None:
             logger.error("Cannot find references.")
             return []
-        logger.debug(f"Reference page range: {reference_page_idx}-{self.pdf.page_count - 1}")
+        logger.debug(f"Reference page range: {reference_page_idx}-{self.page_content.page_count - 1}")
         reference_pages_raw = ''
-        for i in range(reference_page_idx, self.pdf.page_count):
-            reference_pages_raw += self.pdf[i].get_text()
+        for i in range(reference_page_idx, self.page_content.page_count):
+            reference_pages_raw += self.page_content.get_text(i)
         # logger.debug(reference_pages_raw)
 
+    @cached_property
+    def section_heading_offsets(self):
+        """
+        每页章节标题的位置, 整个文档只用预编译的SECTION_HEADING_PATTERN扫描一遍.
+
+        Returns:
+            list: 每页一个字典, key为章节名, value为该章节标题在页面文本中第一次出现的位置.
+        """
+        heading_offsets = []
+        for cur_text in self.text_list:
+            page_offsets = {}
+            for match in SECTION_HEADING_PATTERN.finditer(cur_text):
+                section_name = SECTION_HEADING_NAME_DICT[match.group(1)]
+                if section_name not in page_offsets:
+                    page_offsets[section_name] = match.start()
+            heading_offsets.append(page_offsets)
+        return heading_offsets
+
     def _get_all_page_index(self):
-        # 定义需要寻找的章节名称列表
-        section_list = ["Abstract",
-                        'Introduction', 'Related Work', 'Background',
-                        "Preliminary", "Problem Formulation",
-                        'Methods', 'Methodology', "Method", 'Approach', 'Approaches',
-                        # exp
-                        "Materials and Methods", "Experiment Settings",
-                        'Experiment', "Experimental Results", "Evaluation", "Experiments",
-                        "Results", 'Findings', 'Data Analysis',
-                        "Discussion", "Results and Discussion", "Conclusion",
-                        'References']
         # 初始化一个字典来存储找到的章节和它们在文档中出现的页码
         section_page_dict = {}
-        # 遍历每一页文档
-        for page_index, page in enumerate(self.pdf):
-            # 获取当前页面的文本内容
-            cur_text = page.get_text()
-            # 遍历需要寻找的章节名称列表
-            for section_name in section_list:
-                # 将章节名称转换成大写形式
-                section_name_upper = section_name.upper()
-                # 如果当前页面包含"Abstract"这个关键词
-                if "Abstract" == section_name and section_name in cur_text:
-                    # 将"Abstract"和它所在的页码加入字典中
+        # 遍历每一页文档, 章节按SECTION_NAME_LIST的顺序加入字典, 多页出现时记录最后一页
+        for page_index, page_offsets in enumerate(self.section_heading_offsets):
+            for section_name in SECTION_NAME_LIST:
+                if section_name in page_offsets:
                     section_page_dict[section_name] = page_index
-                # 如果当前页面包含章节名称，则将章节名称和它所在的页码加入字典中
-                else:
-                    if section_name + '\n' in cur_text:
-                        section_page_dict[section_name] = page_index
-                    elif section_name_upper + '\n' in cur_text:
-                        section_page_dict[section_name] = page_index
         # 返回所有找到的章节名称及它们在文档中出现的页码
         return section_page_dict
 
     def _get_all_page(self):
         """
         获取PDF文件中每个页面的文本信息，并将文本信息按照章节组织成字典返回。
+        章节在起始页的位置取自section_heading_offsets.
 
         Returns:
             section_dict (dict): 每个章节的文本信息字典，key为章节名，value为章节文本。
         """
-        text = ''
-        text_list = []
         section_dict = {}
-
-        # 再处理其他章节：
-        text_list = [page.get_text() for page in self.pdf]
-        for sec_index, sec_name in enumerate(self.section_page_dict):
+        text_list = self.text_list
+        heading_offsets = self.section_heading_offsets
+        section_names = list(self.section_page_dict.keys())
+        for sec_index, sec_name in enumerate(section_names):
             logger.debug(','.join([str(sec_index), sec_name, str(self.section_page_dict[sec_name])]))
             if sec_index <= 0 and self.abs:
                 continue
+            # 直接考虑后面的内容：
+            start_page = self.section_page_dict[sec_name]
+            next_sec = section_names[sec_index + 1] if sec_index < len(section_names) - 1 else None
+            end_page = self.section_page_dict[next_sec] if next_sec else len(text_list)
+            logger.debug(f"start_page, end_page: {start_page}, {end_page}")
+            start_i = heading_offsets[start_page].get(sec_name, -1)
+            cur_sec_text = ''
+            if end_page - start_page == 0:
+                if next_sec:
+                    end_i = heading_offsets[start_page].get(next_sec, -1)
+                    cur_sec_text += text_list[start_page][start_i:end_i]
             else:
-                # 直接考虑后面的内容：
-                start_page = self.section_page_dict[sec_name]
-                if sec_index < len(list(self.section_page_dict.keys())) - 1:
-                    end_page = self.section_page_dict[list(self.section_page_dict.keys())[sec_index + 1]]
-                else:
-                    end_page = len(text_list)
-                logger.debug(f"start_page, end_page: {start_page}, {end_page}")
-                cur_sec_text = ''
-                if end_page - start_page == 0:
-                    if sec_index < len(list(self.section_page_dict.keys())) - 1:
-                        next_sec = list(self.section_page_dict.keys())[sec_index + 1]
-                        if text_list[start_page].find(sec_name) == -1:
-                            start_i = text_list[start_page].find(sec_name.upper())
-                        else:
-                            start_i = text_list[start_page].find(sec_name)
-                        if text_list[start_page].find(next_sec) == -1:
-                            end_i = text_list[start_page].find(next_sec.upper())
-                        else:
-                            end_i = text_list[start_page].find(next_sec)
-                        cur_sec_text += text_list[start_page][start_i:end_i]
-                else:
-                    for page_i in range(start_page, end_page):
-                        #                         print("page_i:", page_i)
-                        if page_i == start_page:
-                            if text_list[start_page].find(sec_name) == -1:
-                                start_i = text_list[start_page].find(sec_name.upper())
-                            else:
-                                start_i = text_list[start_page].find(sec_name)
-                            cur_sec_text += text_list[page_i][start_i:]
-                        elif page_i < end_page:
-                            cur_sec_text += text_list[page_i]
-                        elif page_i == end_page:
-                            if sec_index < len(list(self.section_page_dict.keys())) - 1:
-                                next_sec = list(self.section_page_dict.keys())[sec_index + 1]
-                                if text_list[start_page].find(next_sec) == -1:
-                                    end_i = text_list[start_page].find(next_sec.upper())
-                                else:
-                                    end_i = text_list[start_page].find(next_sec)
-                                cur_sec_text += text_list[page_i][:end_i]
-                section_dict[sec_name] = cur_sec_text.replace('-\n', '').replace('\n', ' ')
+                cur_sec_text += text_list[start_page][start_i:]
+                for page_i in range(start_page + 1, end_page):
+                    cur_sec_text += text_list[page_i]
+            section_dict[sec_name] = cur_sec_text.replace('-\n', '').replace('\n', ' ')
         return section_dict
 
     ### MODIFIED FROM CHATPAPER2XMIND
@@ -404,13 +485,22 @@ class Paper:
         # Section Dict Extract
 
     def get_section_titles(self, withlevel=False, verbose=False):
+        # Section titles never change for a document, later callers share the first result.
+        if self.__section_titles is None:
+            self.__section_titles = [tuple(t) for t in self._get_artifact('section_titles',
+                                                                           self.__detect_section_titles)]
+        section_title = list(self.__section_titles)
+        return section_title if withlevel else [t[0] for t in section_title]
+
+    def __detect_section_titles(self):
         section_title = []
-        self.pdf = fitz.open(self.path)
         # ref_break_flag = False
         level1_matchstr = SECTION_TITLE_MATCHSTR[0]
         level2_matchstr = SECTION_TITLE_MATCHSTR[1]
-        for page in self.pdf:
-            blocks = page.get_text("dict", flags=0)["blocks"]
+        for page_index in range(self.page_content.page_count):
+            blocks = self.page_content.get_blocks(page_index)
+            column_bbox = get_bounding_box(getColumnRect(self.page_content.pdf[page_index],
+                                                         self.page_content.column_layout[page_index], ymargin=40))
             for block in blocks:
                 # Assume: Section title is the first "Line" or multiple "Lines" that have the same y position in one "block"
                 is_equation = False
@@ -427,9 +517,8 @@ class Paper:
                         line_text = line_text + "".join([span["text"] for span in line["spans"]]) + "\n"
                     else:
                         break
-                if is_inbox(block['bbox'][0:2], get_bounding_box(getColumnRectLegacy(page, ymargin=40))) \
-                        and is_inbox(block['bbox'][2:4],
-                                     get_bounding_box(getColumnRectLegacy(page, ymargin=40))) and not is_equation:
+                if is_inbox(block['bbox'][0:2], column_bbox) \
+                        and is_inbox(block['bbox'][2:4], column_bbox) and not is_equation:
                     if re.match(level2_matchstr, line_text):
                         if line_text.startswith('I.') and len(section_title) < 7:  # Considering I. i.e. ABCDEFGHI
                             section_title.append((line_text, 1))
@@ -447,19 +536,58 @@ class Paper:
         section_title = [(re.search(ABS_MATCHSTR, self.all_text).group(), 1)] \
                         + section_title \
                         + [(re.search(REF_MATCHSTR, self.all_text).group(), 1)]
-        return section_title if withlevel else [t[0] for t in section_title]
+        return section_title
 
     def get_section_textposdict(self):
+        if self.__section_textposdict is None:
+            section_title = self.get_section_titles()
+            section_dict = {}
+            for i in range(0, len(section_title) - 1):
+                title = section_title[i]
+                latter_title = section_title[i + 1]
+                begin_pos = self.all_text.find(title)
+                end_pos = self.all_text.find(latter_title)
+                section_dict[title] = (begin_pos, end_pos)
+                if begin_pos == -1:
+                    print(f"Warning: {title} not found in all_text.")
+            self.__section_textposdict = section_dict
+        return dict(self.__section_textposdict)
+
+    @cached_property
+    def page_offsets(self):
+        """
+        Character offset of every page in all_text.
+        """
+        page_offsets = []
+        offset = 0
+        for text in self.text_list:
+            page_offsets.append(offset)
+            offset += len(text) + 1  # all_text用空格连接各页
+        return page_offsets
+
+    def group_by_section(self, item_ls):
+        """
+        Assign items (text_pos, ...) to the section whose text range (begin, end) strictly contains text_pos.
+        Section ranges are sorted once and each item is placed by bisect; overlapping ranges (badly detected
+        titles) fall back to checking every section.
+        :return: Dict of section titles (without the last one) with item lists, items keep their order.
+        """
         section_title = self.get_section_titles()
-        section_dict = {}
-        for i in range(0, len(section_title) - 1):
-            title = section_title[i]
-            latter_title = section_title[i + 1]
-            begin_pos = self.all_text.find(title)
-            end_pos = self.all_text.find(latter_title)
-            section_dict[title] = (begin_pos, end_pos)
-            if begin_pos == -1:
-                print(f"Warning: {title} not found in all_text.")
+        pos_dict = self.get_section_textposdict()
+        titles = list(dict.fromkeys(section_title[:-1]))
+        section_dict = {title: [] for title in titles}
+        ranges = sorted((pos_dict[title][0], pos_dict[title][1], title) for title in titles)
+        begins = [r[0] for r in ranges]
+        disjoint = all(ranges[i][1] <= ranges[i + 1][0] + 1 for i in range(len(ranges) - 1))
+        for item in item_ls:
+            if disjoint:
+                idx = bisect.bisect_left(begins, item[0]) - 1
+                if idx >= 0 and item[0] < ranges[idx][1]:
+                    section_dict[ranges[idx][2]].append(item)
+            else:
+                for title in titles:
+                    if pos_dict[title][0] < item[0] < pos_dict[title][1]:
+                        section_dict[title].append(item)
         return section_dict
 
     # def get_section_textdict(self, remove_title=False):
@@ -519,27 +647,19 @@ class Paper:
         img_ls = []
         for i in range(len(self.pdf)):
             page = self.pdf[i]
-            img_box = getFigRect(page)
+            img_box = getFigRect(page, blocks=self.page_content.get_blocks(i),
+                                 column_rects=getColumnRect(page, self.page_content.column_layout[i]))
             if img_box:
                 for box in img_box:
-                    img_ls.append((get_box_textpos(page, box, self.all_text),
+                    img_ls.append((get_box_textpos(page, box, self.all_text,
+                                                   blocks=self.page_content.get_blocks(i),
+                                                   start=self.page_offsets[i]),
                                    i, box))
         if verbose:
             logger.debug(f'Total images found: {str(len(img_ls))}')
-        section_title = self.get_section_titles()
-        pos_dict = self.get_section_textposdict()
-        section_dict = {}
-        match_cnt = 0
-        for title in section_title[:-1]:
-            section_dict[title] = []
-            for img in img_ls:
-                if img[0] > pos_dict[title][0] and img[0] < pos_dict[title][1]:
-                    section_dict[title].append(img)
-                    match_cnt += 1
-                # elif section_dict[title]:
-                #     break
+        section_dict = self.group_by_section(img_ls)
         if verbose:
-            logger.debug('Images match the content: f{match_cnt}')
+            logger.debug(f'Images match the content: {sum(len(i) for i in section_dict.values())}')
         return section_dict
 
     def get_section_imagedict_jvm(self, snap_with_caption=True, verbose=False):
@@ -548,7 +668,6 @@ class Paper:
         :return: Dict of section titles with tuple item list
         (img_text_pos, page_number, img_bbox, img_caption)
         """
-        self.pdf = fitz.open(self.path)  # pdf文档
         img_ls = []
         for d in self.PDFF2data.get('figures', []):
             if snap_with_caption:
@@ -557,33 +676,20 @@ class Paper:
                      d['regionBoundary']['x2'], d['regionBoundary']['y2']),
                     (d['captionBoundary']['x1'], d['captionBoundary']['y1'],
                      d['captionBoundary']['x2'], d['captionBoundary']['y2'])])
-                img_ls.append((get_box_textpos(self.pdf[d['page']], box, self.all_text),
+                img_ls.append((get_box_textpos(self.pdf[d['page']], box, self.all_text,
+                                               blocks=self.page_content.get_blocks(d['page']),
+                                               start=self.page_offsets[d['page']]),
                                d['page'], box))
             else:
                 box = (d['regionBoundary']['x1'], d['regionBoundary']['y1'],
                        d['regionBoundary']['x2'], d['regionBoundary']['y2'])
-                img_ls.append((get_box_textpos(self.pdf[d['page']], box, self.all_text),
+                img_ls.append((get_box_textpos(self.pdf[d['page']], box, self.all_text,
+                                               blocks=self.page_content.get_blocks(d['page']),
+                                               start=self.page_offsets[d['page']]),
                                d['page'], box, d['caption']))
         if verbose:
             logger.debug(f'Total images found: {str(len(img_ls))}')
-        section_title = self.get_section_titles()
-        pos_dict = self.get_section_textposdict()
-        section_dict = {}
-        match_cnt = 0
-        for title in section_title[:-1]:
-            section_dict[title] = []
-            # if verbose:
-            #     print('Title:', title, 'Begin pos:',
-            #           pos_dict[title][0], 'End pos:', pos_dict[title][1])
-            for img in img_ls:
-                if img[0] > pos_dict[title][0] and img[0] < pos_dict[title][1]:
-                    section_dict[title].append(img)
-                    match_cnt += 1
-                # elif section_dict[title]:
-                #     break
-        # if verbose:
-        #     print('Images match the content:', match_cnt)
-        return section_dict
+        return self.group_by_section(img_ls)
 
 
 def main():
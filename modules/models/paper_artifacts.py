@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+# Bump when a change of Paper parsing changes any stored field, older artifacts are then ignored.
+PAPER_PARSER_VERSION = 3
+ARTIFACT_SCHEMA_VERSION = 1
+ARTIFACT_FIELDS = {
+    'raw_title': str,
+    'title_page': int,
+    'section_page_dict': dict,
+    'section_body_dict': dict,
+    'section_titles': list,
+    'PDFF2data': dict,
+}
+
+
+def get_file_checksum(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class PaperArtifactCache:
+    """
+    On-disk cache of parsed Paper structure, one JSON file per PDF checksum:
+    {"schema": 1, "parser_version": 1, "checksum": ..., "updated_at": ..., "fields": {...}}
+    Only fields listed in ARTIFACT_FIELDS with the expected type are loaded, a file written by another parser
+    version is treated as missing.
+    """
+
+    def __init__(self, root_path):
+        self.__root = Path(root_path)
+        self.__lock = threading.Lock()
+
+    def get_artifact_path(self, checksum):
+        return self.__root / f'{checksum}.json'
+
+    def load(self, checksum):
+        """
+        :return: Dict of stored fields, empty if nothing valid is stored.
+        """
+        artifact_path = self.get_artifact_path(checksum)
+        if not artifact_path.exists():
+            return {}
+        try:
+            with open(artifact_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Artifact broken, ignored: {artifact_path} {str(e)}")
+            return {}
+        if data.get('schema') != ARTIFACT_SCHEMA_VERSION or data.get('parser_version') != PAPER_PARSER_VERSION \
+                or data.get('checksum') != checksum:
+            return {}
+        return {key: value for key, value in data.get('fields', {}).items()
+                if key in ARTIFACT_FIELDS and isinstance(value, ARTIFACT_FIELDS[key])}
+
+    def store(self, checksum, fields: dict):
+        """
+        Merge fields into the artifact of checksum.
+        """
+        fields = {key: value for key, value in fields.items() if key in ARTIFACT_FIELDS}
+        if not fields:
+            return
+        artifact_path = self.get_artifact_path(checksum)
+        with self.__lock:
+            stored_fields = self.load(checksum)
+            stored_fields.update(fields)
+            data = {'schema': ARTIFACT_SCHEMA_VERSION,
+                    'parser_version': PAPER_PARSER_VERSION,
+                    'checksum': checksum,
+                    'updated_at': datetime.now().isoformat(),
+                    'fields': stored_fields}
+            try:
+                os.makedirs(self.__root, exist_ok=True)
+                tmp_path = artifact_path.with_suffix(f'.{os.getpid()}_{threading.get_ident()}.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, artifact_path)
+            except Exception as e:
+                logger.warning(f"Cannot store artifact {artifact_path}: {str(e)}")
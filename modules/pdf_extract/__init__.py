@@ -9,6 +9,11 @@ import numpy as np
 from os import path as op
 import subprocess
 import json
+import shutil
+import bisect
+from loguru import logger
+
+from .render_cache import PixmapRenderCache, get_render_zoom
 
 # FIXME: this is not robust
 # from config import *
@@ -18,6 +23,22 @@ DIR_PATH = op.dirname(op.abspath(__file__))
 PDF_FIGURES_JAR_PATH = op.join(
     DIR_PATH, "pdffigures2", "pdffigures2-assembly-0.0.12-SNAPSHOT.jar"
 )
+# Figures are rendered for this display width (px), zoom bounded by [1, 4]
+FIGURE_TARGET_WIDTH = 800
+RENDER_CACHE = PixmapRenderCache(op.join(TEMP_DIR, "render_cache"))
+
+
+def set_render_cache_root(root_path, max_disk_bytes=None, ttl_seconds=None):
+    """ keep rendered figures under root_path (e.g. the storage path) instead of the per-process TEMP_DIR,
+    so later runs reuse them. The files are bounded by evict_render_cache """
+    global RENDER_CACHE
+    RENDER_CACHE = PixmapRenderCache(str(root_path), max_disk_bytes=max_disk_bytes, ttl_seconds=ttl_seconds)
+
+
+def evict_render_cache():
+    """ remove the rendered figures past the TTL or the disk size of RENDER_CACHE """
+    return RENDER_CACHE.evict()
+
 
 """Debuging"""
 DEBUG_MODE = False
@@ -129,32 +150,43 @@ def box_center(bbox):
     return ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
 
 
-def get_objpixmap(pdf, obj, zoom=4, savepath=None, get_tmpfile_dir=True):
+def get_objpixmap(pdf, obj, zoom=None, savepath=None, get_tmpfile_dir=True, target_width=FIGURE_TARGET_WIDTH,
+                  checksum=None):
     """
     Get pixmap(tmp_path) of the object
+    Renders go through RENDER_CACHE, the same object is rendered and written at most once.
     
     :param pdf: pdf file
     :param obj: object tuple (text position, page number, bbox)
-    :param zoom: zoom of the object
+    :param zoom: zoom of the object, chosen from target_width if not given
     :param savepath: save path of the object
+    :param target_width: display width (px) of the object
+    :param checksum: checksum of the pdf file, the cache key of the document
     :return: pixmap of the object
     """
-    page = pdf[obj[1]]
-    box = obj[2]
-    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=box)
+    zoom = get_render_zoom(obj[2], target_width=target_width, zoom=zoom)
     if savepath and os.path.isdir(savepath):
-        pixmap.save(savepath)
+        _, png_bytes = RENDER_CACHE.get_png(pdf, obj[1], obj[2], zoom, checksum=checksum)
+        with open(os.path.join(savepath, generate_id() + '.png'), 'wb') as f:
+            f.write(png_bytes)
     if get_tmpfile_dir:
-        tmp_path = os.path.join(TEMP_DIR, generate_id() + '.png')
-        pixmap.save(tmp_path)
-        return tmp_path
+        return RENDER_CACHE.get_file(pdf, obj[1], obj[2], zoom, checksum=checksum)
     else:
-        return pixmap
+        return pdf[obj[1]].get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=obj[2])
+
+
+def get_objpng(pdf, obj, zoom=None, target_width=FIGURE_TARGET_WIDTH, checksum=None):
+    """
+    Get PNG bytes of the object, see get_objpixmap
+    """
+    zoom = get_render_zoom(obj[2], target_width=target_width, zoom=zoom)
+    return RENDER_CACHE.get_png(pdf, obj[1], obj[2], zoom, checksum=checksum)[1]
 
 
 # Section Judge
-def get_plaintext_sample(page, box, sample_len=20):
-    blocks = page.get_text("dict", flags=0)["blocks"]
+def get_plaintext_sample(page, box, sample_len=20, blocks=None):
+    if blocks is None:
+        blocks = page.get_text("dict", flags=0)["blocks"]
     sample_str = ""
     flag = False
     for block in blocks:
@@ -171,12 +203,17 @@ def get_plaintext_sample(page, box, sample_len=20):
     return sample_str  # considering text is all checked
 
 
-def get_box_textpos(page, box, all_text):
+def get_box_textpos(page, box, all_text, blocks=None, start=0):
     """ get the position of the box in the all_text
     TODO: This is not a robust method to find the position of the box.
+    blocks: cached page.get_text("dict", flags=0)["blocks"] of page, if any
+    start: offset of the page in all_text, the search starts there and falls back to the whole text
     """
-    text = get_plaintext_sample(page, box)
-    return all_text.find(text)
+    text = get_plaintext_sample(page, box, blocks=blocks)
+    pos = all_text.find(text, start)
+    if pos == -1 and start:
+        pos = all_text.find(text)
+    return pos
 
 
 ##########################################
@@ -310,31 +347,99 @@ def draw_eqbox(pdf):
 #######################################
 
 ## Compose Detection
-# TODO: Not yet stable
-def getColumnRect(page, resolution=50, critic=5, margin=5, drawDen=False):
-    """ Get the column rect of the page"""
-    LBDensity = np.zeros(resolution)
-    RBDensity = np.zeros(resolution)
+def getColumnLayout(page, blocks=None, xmargin=40, max_columns=3, min_lines=8,
+                    gutter_ratio=0.3, min_gutter=8, min_column_ratio=0.2):
+    """ Detect the column layout of the page from the x coverage of its text lines
+    A gutter is an interior x range covered by few lines (weighted by line height) compared to the densest x,
+    so full width lines (title, abstract, wide captions) crossing the gutter of a 2 column page are tolerated.
+
+    :param blocks: cached page.get_text("dict", flags=0)["blocks"] of page, if any
+    :param xmargin: outer margin of the columns, widened if the text goes beyond it
+    :param max_columns: at most max_columns - 1 gutters (the widest ones) are kept
+    :param min_lines: pages with less text lines are not decided
+    :param gutter_ratio: critical coverage of a gutter, relative to the max coverage
+    :param min_gutter: minimal gutter width (pt)
+    :param min_column_ratio: minimal column width relative to the text width (drops line number margins)
+    :return: list of column x ranges [(x0, x1), ...] from left to right, None if the page cannot be decided
+    """
+    if blocks is None:
+        blocks = page.get_text("dict", flags=0)["blocks"]
+    line_bboxes = [line['bbox'] for block in blocks if block.get('type', 0) == 0
+                   for line in block.get('lines', [])
+                   if ''.join(span['text'] for span in line['spans']).strip()]
+    if len(line_bboxes) < min_lines:
+        return None
     width = page.bound()[2]
+    lines = np.clip(np.array(line_bboxes, dtype=np.float64), 0, None)
+    lines[:, [0, 2]] = np.clip(lines[:, [0, 2]], 0, width)
+    text_x0, text_x1 = lines[:, 0].min(), lines[:, 2].max()
+    col_x0, col_x1 = min(xmargin, text_x0), max(width - xmargin, text_x1)
+
+    # Coverage on a 1 pt grid, line x ranges accumulated in a difference array
+    offset = int(np.floor(text_x0))
+    bins = int(np.ceil(text_x1)) - offset
+    if bins <= 0:
+        return [(float(col_x0), float(col_x1))]
+    start = np.floor(lines[:, 0]).astype(np.int64) - offset
+    stop = np.ceil(lines[:, 2]).astype(np.int64) - offset
+    diff = np.zeros(bins + 1)
+    np.add.at(diff, start, lines[:, 3] - lines[:, 1])
+    np.add.at(diff, stop, -(lines[:, 3] - lines[:, 1]))
+    coverage = np.cumsum(diff[:-1])
+
+    # Runs of low coverage, the ones touching the text edge are margins
+    low = np.concatenate(([0], (coverage <= gutter_ratio * coverage.max()).astype(np.int8), [0]))
+    run_edges = np.flatnonzero(np.diff(low))
+    runs = [(run_start, run_stop) for run_start, run_stop in zip(run_edges[::2], run_edges[1::2])
+            if run_start > 0 and run_stop < bins and run_stop - run_start >= min_gutter]
+    runs = sorted(sorted(runs, key=lambda x: x[1] - x[0], reverse=True)[:max_columns - 1])
+
+    bounds = [text_x0] + [offset + (run_start + run_stop) / 2 for run_start, run_stop in runs] + [text_x1]
+    min_column_width = min_column_ratio * (text_x1 - text_x0)
+    gutters = [bounds[i] for i in range(1, len(bounds) - 1)
+               if bounds[i] - bounds[i - 1] >= min_column_width and bounds[i + 1] - bounds[i] >= min_column_width]
+    bounds = [col_x0] + gutters + [col_x1]
+    return [(float(bounds[i]), float(bounds[i + 1])) for i in range(len(bounds) - 1)]
+
+
+def getDocumentColumnLayout(pdf, page_blocks=None, **kwargs):
+    """ Column layout of every page of the document
+    Pages that cannot be decided (e.g. figure only pages) take the most common layout of the document, the
+    legacy 2 column split if no page is decided.
+
+    :param page_blocks: cached blocks of every page (list, index is the page number), if any
+    :return: list of column x ranges per page, see getColumnLayout
+    """
+    layouts = [getColumnLayout(page, blocks=page_blocks[i] if page_blocks else None, **kwargs)
+               for i, page in enumerate(pdf)]
+    decided = [layout for layout in layouts if layout is not None]
+    default_layout = None
+    if decided:
+        column_counts = [len(layout) for layout in decided]
+        common_count = max(set(column_counts), key=column_counts.count)
+        default_layout = [tuple(col) for col in np.median(
+            np.array([layout for layout in decided if len(layout) == common_count]), axis=0).tolist()]
+    res = []
+    for i, layout in enumerate(layouts):
+        if layout is None:
+            layout = default_layout if default_layout else \
+                [(col[0], col[2]) for col in getColumnRectLegacy(pdf[i])]
+        res.append(layout)
+    return res
+
+
+def getColumnRect(page, layout=None, blocks=None, ymargin=0):
+    """ Get the column rects of the page
+    :param layout: column x ranges of the page (see getColumnLayout), detected if not given
+    :param blocks: cached page.get_text("dict", flags=0)["blocks"] of page, if any
+    :return: list of column rects [x0, y0, x1, y1], the legacy 2 column split if the layout cannot be decided
+    """
+    if layout is None:
+        layout = getColumnLayout(page, blocks=blocks)
+    if layout is None:
+        return getColumnRectLegacy(page, ymargin=ymargin)
     height = page.bound()[3]
-    blocks = page.get_text("dict", flags=0)["blocks"]
-    for block in blocks:
-        LBDensity[int(np.round(block['bbox'][0] / width * resolution))] += 1
-        RBDensity[int(np.round(block['bbox'][2] / width * resolution))] += 1
-    Density = LBDensity + RBDensity
-    if drawDen:
-        plot(range(len(Density)), Density)
-    x_seg = []
-    column_rects = []
-    for x in range(1, resolution - 1):
-        # find local maximas
-        if Density[x - 1] <= Density[x] and Density[x] >= Density[x + 1] \
-                and Density[x] >= critic:
-            x_seg.append(x)
-    for i in range(len(x_seg) - 1):
-        column_rects.append([x_seg[i] / resolution * width - margin, 0,
-                             x_seg[i + 1] / resolution * width + margin, height])
-    return column_rects
+    return [[x0, ymargin, x1, height - ymargin] for x0, x1 in layout]
 
 
 def getColumnRectLegacy(page, colnum=2, xmargin=40, ymargin=0):
@@ -348,6 +453,54 @@ def getColumnRectLegacy(page, colnum=2, xmargin=40, ymargin=0):
 def combineRect(bbox, critic_dis=5, critic_alignerr=10, dir=1):
     """
     Combine the equation bounding boxes
+    Same result as combineRectLegacy: every box is compared with later boxes in their original coordinates,
+    but candidates are taken from a sweep over boxes sorted by their tangential lower edge instead of all pairs.
+    :param bbox: list of bounding boxes
+    :param critic_dis: critical distance of combining direction
+    :param critic_alignerr: critical align error of tangential direction
+    :param dir: 0 for x direction, 1 for y direction
+    """
+    if dir == 1:  # y direction
+        up, low, up2, low2 = 3, 1, 2, 0
+    elif dir == 0:  # x direction
+        up, low, up2, low2 = 2, 0, 3, 1
+    else:
+        raise ValueError("dir should be 0 or 1")
+    bbox = list(bbox)
+    if len(bbox) < 2:
+        return bbox
+    boxes = np.array([[b[0], b[1], b[2], b[3]] for b in bbox], dtype=np.float64)
+    order = np.argsort(boxes[:, low2], kind='stable')
+    sorted_low2 = boxes[order, low2]
+    # Same operation order as the legacy comparison, so floats round identically.
+    center_sum = boxes[:, up] + boxes[:, low]
+    length = boxes[:, up] - boxes[:, low]
+    validtag = np.ones(len(bbox), dtype=bool)
+    eps = 1e-6 * (1 + critic_alignerr)
+    for i in range(len(bbox) - 1):
+        if not validtag[i]:
+            continue
+        window = order[bisect.bisect_left(sorted_low2, boxes[i, low2] - critic_alignerr - eps):
+                       bisect.bisect_right(sorted_low2, boxes[i, low2] + critic_alignerr + eps)]
+        cand = np.sort(window[window > i])
+        if len(cand) == 0:
+            continue
+        cand = cand[validtag[cand]]
+        match = (np.abs(center_sum[i] - boxes[cand, up] - boxes[cand, low])
+                 < length[i] + boxes[cand, up] - boxes[cand, low] + critic_dis) \
+                & (np.abs(boxes[cand, low2] - boxes[i, low2]) < critic_alignerr) \
+                & (np.abs(boxes[cand, up2] - boxes[i, up2]) < critic_alignerr)
+        matched = cand[match]
+        if len(matched):
+            validtag[matched] = False
+            # The legacy loop keeps merging with the original box, only the last match survives.
+            bbox[i] = get_bounding_box([bbox[i], bbox[matched[-1]]])
+    return [bbox[i] for i in range(len(bbox)) if validtag[i]]
+
+
+def combineRectLegacy(bbox, critic_dis=5, critic_alignerr=10, dir=1):
+    """
+    Combine the equation bounding boxes (pairwise reference implementation of combineRect)
     :param bbox: list of bounding boxes
     :param critic_dis: critical distance of combining direction
     :param critic_alignerr: critical align error of tangential direction
@@ -389,6 +542,53 @@ def combineRect(bbox, critic_dis=5, critic_alignerr=10, dir=1):
 def getDensityMap(BoxWeightList, roi,
                   resolution=100, dir=1, slideavg_windowsize=1):
     """ Get the density map of the box list
+    Vectorized, same result as getDensityMapLegacy: box ranges are accumulated in a difference array.
+
+    :param BoxWeightList: list of the box and weight (box[4], weight)
+    :param roi: ROI of the density map
+    :param resolution: resolution of the density map
+    :param dir: direction of the density map ([0, 1], i.e. [x, y])
+    :return: density map of the box list (x, density)
+    """
+    if dir == 1:  # y direction
+        up, low, up2, low2 = 3, 1, 2, 0
+    elif dir == 0:  # x direction
+        up, low, up2, low2 = 2, 0, 3, 1
+    else:
+        raise ValueError("dir should be 0 or 1")
+    density = np.zeros(resolution, dtype=np.int32)
+    if BoxWeightList:
+        boxes = np.array([[box[0], box[1], box[2], box[3]] for box, _ in BoxWeightList], dtype=np.float64)
+        weights = np.array([weight for _, weight in BoxWeightList], dtype=np.int64)
+        box_low = np.floor((boxes[:, low] - roi[low]) / (roi[up] - roi[low]) * resolution)
+        box_up = np.ceil((boxes[:, up] - roi[low]) / (roi[up] - roi[low]) * resolution)
+        inside = ((boxes[:, up2] < roi[up2]) & (boxes[:, up2] > roi[low2])) \
+                 | ((boxes[:, low2] < roi[up2]) & (boxes[:, low2] > roi[low2]))
+        box_low = box_low[inside].astype(np.int64)
+        box_up = box_up[inside].astype(np.int64)
+        weights = weights[inside]
+
+        # density[start:stop] with python slice semantics (negative indices count from the end)
+        def slice_index(idx):
+            return np.where(idx < 0, np.maximum(idx + resolution, 0), np.minimum(idx, resolution))
+
+        start = slice_index(box_low)
+        stop = slice_index(box_up)
+        valid = stop > start
+        diff = np.zeros(resolution + 1, dtype=np.int64)
+        np.add.at(diff, start[valid], weights[valid])
+        np.add.at(diff, stop[valid], -weights[valid])
+        density = np.cumsum(diff[:-1]).astype(np.int32)
+    if slideavg_windowsize != 1:
+        density = np.convolve(density, np.ones(slideavg_windowsize) / slideavg_windowsize, mode='same')
+    return (
+        np.array(range(resolution)) / resolution * (roi[up] - roi[low]),
+        density)
+
+
+def getDensityMapLegacy(BoxWeightList, roi,
+                  resolution=100, dir=1, slideavg_windowsize=1):
+    """ Get the density map of the box list (per box reference implementation of getDensityMap)
     
     :param BoxWeightList: list of the box and weight (box[4], weight)
     :param roi: ROI of the density map
@@ -436,17 +636,19 @@ def getDensityMap(BoxWeightList, roi,
 
 
 # Equation Box Detection
-def getEqBoxList(page, numbox_margin=5):
+def getEqBoxList(page, numbox_margin=5, blocks=None):
     """
     Get the (equation box, numbering box, irregular box) of the page
     
     :param page: page of the pdf
     :param numbox_enlarge: enlarge the numbering box
+    :param blocks: cached page.get_text("dict", flags=0)["blocks"] of page, if any
     """
     eqbox = []
     numbox = []
     irrbox = []
-    blocks = page.get_text("dict", flags=0)["blocks"]
+    if blocks is None:
+        blocks = page.get_text("dict", flags=0)["blocks"]
     for block in blocks:
         for line in block['lines']:
             for span in line['spans']:
@@ -527,25 +729,33 @@ def getEquationRectFromMap(denMap, numBoxList, columnROI, c_bias=0, dir=1, dirma
     return EqRects
 
 
-def getEqRect(page, drawDen=False):
-    """ Get the equation rect of the page"""
+def getEqRect(page, drawDen=False, blocks=None, legacy=False, column_rects=None):
+    """ Get the equation rect of the page
+    :param blocks: cached page.get_text("dict", flags=0)["blocks"] of page, if any
+    :param legacy: use the reference (non vectorized) density map and rect combination
+    :param column_rects: column rects of the page (see getColumnRect), detected if not given
+    """
+    density_map_func = getDensityMapLegacy if legacy else getDensityMap
+    combine_rect_func = combineRectLegacy if legacy else combineRect
     EqRects = []
-    boxLists = getEqBoxList(page)
+    boxLists = getEqBoxList(page, blocks=blocks)
     EqBoxWeight = getEqBoxWeight(boxLists)
-    column_rects = getColumnRectLegacy(page)
+    if column_rects is None:
+        column_rects = getColumnRect(page, blocks=blocks)
     for col in column_rects:
-        map = getDensityMap(EqBoxWeight, col)
+        map = density_map_func(EqBoxWeight, col)
         if drawDen:
             plot(map[0], map[1])
         EqRects += getEquationRectFromMap(map, boxLists[1], col)
-    return combineRect(EqRects)
+    return combine_rect_func(EqRects)
 
 
 # Figure Box Detection
-def getFigBoxList(page):
+def getFigBoxList(page, blocks=None):
     """
     Get the figure box list of the page
     :param page: page of the pdf
+    :param blocks: cached page.get_text("dict", flags=0)["blocks"] of page, if any
     :return: (path box, image box, numbering box, irrelevant box)
     """
     pathbox = []
@@ -560,7 +770,8 @@ def getFigBoxList(page):
     for image in images:
         imgbox.append(page.get_image_bbox(image))
     # Numbering block
-    blocks = page.get_text("dict", flags=0)["blocks"]
+    if blocks is None:
+        blocks = page.get_text("dict", flags=0)["blocks"]
     for block in blocks:
         if re.match(IMG_MATCHSTR, block['lines'][0]['spans'][0]['text']):
             numbox.append(block['bbox'])
@@ -675,14 +886,23 @@ def getFigureRectFromMap(denMap, numBoxList, columnROI, c_bias=3, dir=1, dirmarg
     return FigRects
 
 
-def getFigRect(page, drawDen=DEBUG_MODE):
-    """ Get the figure rect of the page"""
+def getFigRect(page, drawDen=DEBUG_MODE, blocks=None, legacy=False, column_rects=None):
+    """ Get the figure rect of the page
+    :param blocks: cached page.get_text("dict", flags=0)["blocks"] of page, if any
+    :param legacy: use the reference (non vectorized) density map and rect combination
+    :param column_rects: column rects of the page (see getColumnRect), detected if not given
+    """
+    density_map_func = getDensityMapLegacy if legacy else getDensityMap
+    combine_rect_func = combineRectLegacy if legacy else combineRect
     FigRects = []
-    boxLists = getFigBoxList(page)
+    boxLists = getFigBoxList(page, blocks=blocks)
     FigBoxWeight = getFigBoxWeight(boxLists)
-    column_rects = getColumnRectLegacy(page)
+    if column_rects is None:
+        column_rects = getColumnRect(page, blocks=blocks)
+    column_maps = []
     for col in column_rects:
-        map = getDensityMap(FigBoxWeight, col, slideavg_windowsize=5)
+        map = density_map_func(FigBoxWeight, col, slideavg_windowsize=5)
+        column_maps.append(map)
         if drawDen:
             amp = 40
             maxden = max(map[1]) if max(map[1]) > 0 else 1
@@ -693,29 +913,62 @@ def getFigRect(page, drawDen=DEBUG_MODE):
         # FigRects += getFigureRectFromMap(map, col)
         FigRects += getFigureRectFromMap(map, boxLists[2], col)
 
-    # FIXME: Only support 2 columns
-    def get2ColunmDensity(val1, val2):
-        if val1 * val2 <= 0:
-            return min(val1, val2)
+    if len(column_maps) > 1:
+        # Figures across columns: density of all the columns together
+        totalROI = get_bounding_box(column_rects)
+        x_ls = column_maps[0][0]
+        if legacy:
+            def get2ColunmDensity(val1, val2):
+                if val1 * val2 <= 0:
+                    return min(val1, val2)
+                else:
+                    if val1 > 0:
+                        return max(val1, val2)
+                    else:
+                        return min(val1, val2)
+
+            den = list(column_maps[0][1])
+            for map in column_maps[1:]:
+                den = [get2ColunmDensity(den[i], map[1][i]) for i in range(len(den))]
         else:
-            if val1 > 0:
-                return max(val1, val2)
-            else:
-                return min(val1, val2)
-
-    totalROI = get_bounding_box(column_rects)
-    map1 = getDensityMap(FigBoxWeight, column_rects[0], slideavg_windowsize=5)
-    map2 = getDensityMap(FigBoxWeight, column_rects[1], slideavg_windowsize=5)
-    x_ls = map1[0]
-    den = [get2ColunmDensity(map1[1][i], map2[1][i]) for i in range(len(map1[1]))]
-    FigRects += getFigureRectFromMap((x_ls, den), boxLists[2], totalROI)
-    combine_rect = combineRect(combineRect(FigRects, critic_dis=20, dir=1), critic_dis=0, critic_alignerr=20, dir=0)
+            # All columns positive: the largest density, otherwise the smallest one.
+            dens = np.array([map[1] for map in column_maps])
+            den = np.where((dens > 0).all(axis=0), dens.max(axis=0), dens.min(axis=0))
+        FigRects += getFigureRectFromMap((x_ls, den), boxLists[2], totalROI)
+    combine_rect = combine_rect_func(combine_rect_func(FigRects, critic_dis=20, dir=1),
+                                     critic_dis=0, critic_alignerr=20, dir=0)
     if DEBUG_MODE:
         for rect in combine_rect:
             page.draw_rect(rect, color=(0, 1, 0), width=2)
     return combine_rect
 
 
+def getDocumentFigRects(pdf, page_blocks=None, legacy=False, layouts=None):
+    """ Get the figure rects of every page of the document in one call
+    :param page_blocks: cached blocks of every page (list, index is the page number), if any
+    :param layouts: column layout of every page (see getDocumentColumnLayout), detected if not given
+    :return: list of figure rects per page
+    """
+    if layouts is None:
+        layouts = getDocumentColumnLayout(pdf, page_blocks)
+    return [getFigRect(page, blocks=page_blocks[i] if page_blocks else None, legacy=legacy,
+                       column_rects=getColumnRect(page, layouts[i]))
+            for i, page in enumerate(pdf)]
+
+
+def getDocumentEqRects(pdf, page_blocks=None, legacy=False, layouts=None):
+    """ Get the equation rects of every page of the document in one call
+    :param page_blocks: cached blocks of every page (list, index is the page number), if any
+    :param layouts: column layout of every page (see getDocumentColumnLayout), detected if not given
+    :return: list of equation rects per page
+    """
+    if layouts is None:
+        layouts = getDocumentColumnLayout(pdf, page_blocks)
+    return [getEqRect(page, blocks=page_blocks[i] if page_blocks else None, legacy=legacy,
+                      column_rects=getColumnRect(page, layouts[i]))
+            for i, page in enumerate(pdf)]
+
+
 ########################
 ##  PDFFigures 2 API  ##
 ########################
@@ -745,21 +998,105 @@ def getFigRect(page, drawDen=DEBUG_MODE):
 """
 
 
-def parsePDF_PDFFigures2(pdf_file: str):
+# Legacy default, used only if no other java is found.
+LEGACY_JAVA_PATH = r"C:\Program Files\Java\jdk-21\bin\java"
+JAVA_PATH = None
+
+
+def set_java_path(java_path):
+    """ configure the java executable used by pdffigures2 """
+    global JAVA_PATH
+    JAVA_PATH = java_path
+
+
+def get_java_path():
+    """
+    java executable for pdffigures2, in order: set_java_path(), $PDFFIGURES2_JAVA, $JAVA_HOME/bin/java,
+    java on PATH, the legacy Windows JDK path. None if none exists.
+    """
+    candidates = [JAVA_PATH, os.environ.get('PDFFIGURES2_JAVA')]
+    if os.environ.get('JAVA_HOME'):
+        candidates.append(op.join(os.environ['JAVA_HOME'], 'bin', 'java'))
+    candidates += [shutil.which('java'), LEGACY_JAVA_PATH]
+    for candidate in candidates:
+        if candidate and (op.isfile(candidate) or op.isfile(candidate + '.exe')):
+            return candidate
+    return None
+
+
+def parsePDFs_PDFFigures2(pdf_files: dict, threads=None, timeout_per_file=20, min_timeout=60):
+    """
+    Parse figures of many PDFs with one pdffigures2 run over a batch directory, so the JVM starts once.
+    :param pdf_files: Dict of name -> pdf path, name must be unique and usable as a file name (e.g. checksum).
+    :param threads: pdffigures2 worker threads (-t), defaults to the cpu count.
+    :return: Dict of name -> pdffigures2 json, names that failed are left out.
+    """
+    if not pdf_files:
+        return {}
+    java_path = get_java_path()
+    if not java_path or not op.exists(PDF_FIGURES_JAR_PATH):
+        logger.warning(f"pdffigures2 unavailable, java: {java_path}, jar: {PDF_FIGURES_JAR_PATH}")
+        return {}
+    threads = max(1, int(threads if threads else (os.cpu_count() or 1)))
+    batch_dir = tempfile.mkdtemp(dir=TEMP_DIR)
+    input_dir = op.join(batch_dir, 'input')
+    output_dir = op.join(batch_dir, 'output')
+    os.makedirs(input_dir)
+    os.makedirs(output_dir)
+    try:
+        for name, pdf_file in pdf_files.items():
+            link_path = op.join(input_dir, f'{name}.pdf')
+            try:
+                os.symlink(op.abspath(pdf_file), link_path)
+            except OSError:
+                shutil.copyfile(pdf_file, link_path)
+        args = [java_path, "-jar", PDF_FIGURES_JAR_PATH, input_dir,
+                "-g", op.join(output_dir, ""),
+                "-t", str(threads),
+                "-e", "-q"]
+        timeout = max(min_timeout, timeout_per_file * len(pdf_files) / threads)
+        try:
+            subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"pdffigures2 batch timeout after {timeout}s, keep finished results.")
+        res = {}
+        for name in pdf_files.keys():
+            json_path = op.join(output_dir, f'{name}.json')
+            if op.exists(json_path):
+                try:
+                    with open(json_path, encoding='utf-8') as f:
+                        res[name] = json.load(f)
+                except Exception as e:
+                    logger.warning(f"pdffigures2 output broken: {json_path} {str(e)}")
+        logger.info(f"pdffigures2 parsed {len(res)}/{len(pdf_files)} PDFs.")
+        return res
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+
+def parsePDF_PDFFigures2(pdf_file: str, timeout=20):
     """
     Parse figures from the given scientific PDF using pdffigures2
     """
+    java_path = get_java_path()
+    if not java_path or not op.exists(PDF_FIGURES_JAR_PATH):
+        logger.warning(f"pdffigures2 unavailable, java: {java_path}, jar: {PDF_FIGURES_JAR_PATH}")
+        return {}
     args = [
-        r"C:\Program Files\Java\jdk-21\bin\java",
+        java_path,
         "-jar",
         PDF_FIGURES_JAR_PATH,
         pdf_file,
         "-g",
         op.join(TEMP_DIR, "")
     ]
-    _ = subprocess.run(
-        args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=20
-    )
+    try:
+        _ = subprocess.run(
+            args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        logger.warning(f"pdffigures2 timeout: {pdf_file}")
+        return {}
     if 'No errors' in _.__dict__['stdout'].decode('utf-8'):
         if os.path.exists(op.join(TEMP_DIR, op.basename(pdf_file).replace(".pdf", ".json"))):
             return json.load(open(op.join(TEMP_DIR, op.basename(pdf_file).replace(".pdf", ".json")), encoding='utf-8'))
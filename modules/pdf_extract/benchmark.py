@@ -0,0 +1,84 @@
+"""
+Benchmark of the vectorized figure / equation detection against the reference implementation.
+Usage: python -m modules.pdf_extract.benchmark <pdf dir> [--repeat N]
+Every PDF of the directory is processed by both implementations, the rects must be identical.
+"""
+import argparse
+import glob
+import os
+import time
+
+import fitz
+from loguru import logger
+
+from modules.pdf_extract import getFigRect, getEqRect, getDocumentFigRects, getDocumentEqRects, \
+    getDocumentColumnLayout, getColumnRect
+
+
+def to_tuples(rects_per_page):
+    return [[tuple(rect) for rect in rects] for rects in rects_per_page]
+
+
+def benchmark_pdf(pdf_path, repeat=1):
+    """
+    :return: {'pages', 'legacy_seconds', 'vectorized_seconds', 'identical'}
+    """
+    pdf = fitz.open(pdf_path)
+    try:
+        legacy_seconds = 0
+        vectorized_seconds = 0
+        identical = True
+        # Same column layout for both, only the detection itself is compared.
+        layouts = getDocumentColumnLayout(pdf)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            legacy_fig = [getFigRect(page, legacy=True, column_rects=getColumnRect(page, layouts[i]))
+                          for i, page in enumerate(pdf)]
+            legacy_eq = [getEqRect(page, legacy=True, column_rects=getColumnRect(page, layouts[i]))
+                         for i, page in enumerate(pdf)]
+            legacy_seconds += time.perf_counter() - start
+
+            start = time.perf_counter()
+            page_blocks = [page.get_text("dict", flags=0)["blocks"] for page in pdf]
+            vectorized_fig = getDocumentFigRects(pdf, page_blocks, layouts=layouts)
+            vectorized_eq = getDocumentEqRects(pdf, page_blocks, layouts=layouts)
+            vectorized_seconds += time.perf_counter() - start
+
+            identical &= to_tuples(legacy_fig) == to_tuples(vectorized_fig) \
+                         and to_tuples(legacy_eq) == to_tuples(vectorized_eq)
+        return {'pages': pdf.page_count, 'legacy_seconds': legacy_seconds / repeat,
+                'vectorized_seconds': vectorized_seconds / repeat, 'identical': identical}
+    finally:
+        pdf.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Figure / equation detection benchmark.')
+    parser.add_argument('pdf_dir', help='Directory of the PDF corpus.')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    total_legacy = 0
+    total_vectorized = 0
+    mismatch_list = []
+    for pdf_path in sorted(glob.glob(os.path.join(args.pdf_dir, '*.pdf'))):
+        try:
+            res = benchmark_pdf(pdf_path, repeat=args.repeat)
+        except Exception as e:
+            logger.warning(f"Skip {pdf_path}: {str(e)}")
+            continue
+        total_legacy += res['legacy_seconds']
+        total_vectorized += res['vectorized_seconds']
+        if not res['identical']:
+            mismatch_list.append(pdf_path)
+        logger.info(f"{os.path.basename(pdf_path)}: {res['pages']} pages, legacy {res['legacy_seconds']:.3f}s, "
+                    f"vectorized {res['vectorized_seconds']:.3f}s, identical: {res['identical']}")
+    speedup = total_legacy / total_vectorized if total_vectorized else 0
+    logger.info(f"Total: legacy {total_legacy:.3f}s, vectorized {total_vectorized:.3f}s, speedup {speedup:.2f}x")
+    if mismatch_list:
+        logger.error(f"Output differs on {len(mismatch_list)} PDFs: {mismatch_list}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
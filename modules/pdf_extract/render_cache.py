@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import fitz
+
+
+def get_render_zoom(bbox, target_width=None, zoom=None, min_zoom=1, max_zoom=4):
+    """
+    Zoom of a render. A given zoom is used as is, otherwise the zoom that renders the bbox at target_width pixels,
+    bounded by [min_zoom, max_zoom].
+    """
+    if zoom:
+        return zoom
+    box_width = bbox[2] - bbox[0]
+    if not target_width or box_width <= 0:
+        return max_zoom
+    return round(min(max(target_width / box_width, min_zoom), max_zoom), 2)
+
+
+def get_document_key(pdf):
+    """
+    Cache key of a document without known checksum: path, size and modification time.
+    """
+    try:
+        stat = os.stat(pdf.name)
+        return f'{os.path.abspath(pdf.name)}:{stat.st_size}:{stat.st_mtime_ns}'
+    except (OSError, TypeError):
+        return f'memory:{id(pdf)}'
+
+
+class PixmapRenderCache:
+    """
+    PNG renders of PDF regions keyed by (document checksum, page, bbox, zoom).
+    Encoded bytes are kept in a LRU memory cache, and written once to <root>/<key hash>.png when a file path is
+    asked for, so the same figure is never rendered or written twice.
+    The file mtime is the last access time, evict() removes the files older than ttl_seconds, then the least
+    recently used ones above max_disk_bytes.
+    """
+
+    def __init__(self, root_path, max_memory_items=256, max_disk_bytes=None, ttl_seconds=None):
+        self.root_path = root_path
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.__items = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(checksum, page_index, bbox, zoom):
+        bbox_key = ','.join(f'{float(i):.2f}' for i in bbox)
+        return hashlib.sha1(f'{checksum}|{page_index}|{bbox_key}|{float(zoom):.2f}'.encode('utf-8')).hexdigest()
+
+    def __get(self, key):
+        with self.__lock:
+            if key in self.__items:
+                self.__items.move_to_end(key)
+                self.hits += 1
+                return self.__items[key]
+            self.misses += 1
+            return None
+
+    def __put(self, key, png_bytes):
+        with self.__lock:
+            self.__items[key] = png_bytes
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.max_memory_items:
+                self.__items.popitem(last=False)
+
+    @staticmethod
+    def touch(file_path):
+        try:
+            os.utime(file_path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        :return: Count of removed files.
+        """
+        entries = []
+        try:
+            file_names = os.listdir(self.root_path)
+        except OSError:
+            return 0
+        for file_name in file_names:
+            if not file_name.endswith('.png'):
+                continue
+            file_path = os.path.join(self.root_path, file_name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+        expire_before = time.time() - self.ttl_seconds if self.ttl_seconds else None
+        removed = []
+        total_bytes = 0
+        # 从最近访问的开始累计大小
+        for accessed_at, size, file_path in sorted(entries, reverse=True):
+            if expire_before is not None and accessed_at < expire_before:
+                removed.append(file_path)
+                continue
+            total_bytes += size
+            if self.max_disk_bytes is not None and total_bytes > self.max_disk_bytes:
+                removed.append(file_path)
+        for file_path in removed:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        return len(removed)
+
+    def get_png(self, pdf, page_index, bbox, zoom, checksum=None):
+        """
+        :return: (cache key, PNG bytes of the clip bbox of page page_index)
+        """
+        key = self.get_key(checksum or get_document_key(pdf), page_index, bbox, zoom)
+        png_bytes = self.__get(key)
+        if png_bytes is None:
+            file_path = os.path.join(self.root_path, key + '.png')
+            if os.path.exists(file_path):
+                with open(file_path, 'rb') as f:
+                    png_bytes = f.read()
+                self.touch(file_path)
+            else:
+                pixmap = pdf[page_index].get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=bbox)
+                png_bytes = pixmap.tobytes('png')
+            self.__put(key, png_bytes)
+        return key, png_bytes
+
+    def get_file(self, pdf, page_index, bbox, zoom, checksum=None):
+        """
+        :return: Path of the PNG file of the render, written on first use.
+        """
+        key, png_bytes = self.get_png(pdf, page_index, bbox, zoom, checksum=checksum)
+        file_path = os.path.join(self.root_path, key + '.png')
+        if not os.path.exists(file_path):
+            os.makedirs(self.root_path, exist_ok=True)
+            tmp_path = f'{file_path}.{os.getpid()}_{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(png_bytes)
+            os.replace(tmp_path, file_path)
+        else:
+            self.touch(file_path)
+        return file_path
@@ -0,0 +1,93 @@
+import os
+import re
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from modules.data_source.arxiv.arxiv_downloader import ResumableDownloader, DownloadTimeoutException
+
+PDF_BODY = b'%PDF-1.4\n' + os.urandom(300 * 1024) + b'\n%%EOF\n'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in of the arxiv PDF host with Range support. server.cut_at drops the connection of the next
+    response after that many body bytes, server.chunk_delay slows every 64KB chunk down.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        range_header = self.headers.get('Range')
+        self.server.range_headers.append(range_header)
+        start = int(re.match(r'bytes=(\d+)-', range_header).group(1)) if range_header else 0
+        body = PDF_BODY[start:]
+        self.send_response(206 if range_header else 200)
+        if range_header:
+            self.send_header('Content-Range', f'bytes {start}-{len(PDF_BODY) - 1}/{len(PDF_BODY)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        cut_at, self.server.cut_at = self.server.cut_at, None
+        try:
+            for offset in range(0, len(body), 64 * 1024):
+                if cut_at is not None and offset >= cut_at:
+                    self.wfile.flush()
+                    self.connection.close()
+                    return
+                self.wfile.write(body[offset:offset + 64 * 1024])
+                if self.server.chunk_delay:
+                    time.sleep(self.server.chunk_delay)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. on its attempt deadline.
+            pass
+
+
+class ResumableDownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.range_headers = []
+        self.server.cut_at = None
+        self.server.chunk_delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/2401.00001v1.pdf'
+        self.target_path = os.path.join(tempfile.mkdtemp(), '2401.00001v1.pdf')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_interrupted_download_resumes_with_range(self):
+        downloader = ResumableDownloader(timeout=(2, 2))
+        self.server.cut_at = 128 * 1024
+        with self.assertRaises(Exception):
+            downloader.fetch(self.url, self.target_path)
+        part_path = ResumableDownloader.get_part_path(self.target_path)
+        resume_from = os.path.getsize(part_path)
+        self.assertGreater(resume_from, 0)
+        self.assertFalse(os.path.exists(self.target_path))
+
+        self.assertEqual(downloader.fetch(self.url, self.target_path), self.target_path)
+        self.assertEqual(self.server.range_headers, [None, f'bytes={resume_from}-'])
+        with open(self.target_path, 'rb') as f:
+            self.assertEqual(f.read(), PDF_BODY)
+        self.assertFalse(part_path.exists())
+
+    def test_attempt_deadline_keeps_part(self):
+        downloader = ResumableDownloader(timeout=(2, 2), total_timeout=0.2)
+        self.server.chunk_delay = 0.1
+        with self.assertRaises(DownloadTimeoutException):
+            downloader.fetch(self.url, self.target_path)
+        self.assertGreater(os.path.getsize(ResumableDownloader.get_part_path(self.target_path)), 0)
+
+        self.server.chunk_delay = 0
+        downloader.fetch(self.url, self.target_path)
+        self.assertTrue(self.server.range_headers[-1].startswith('bytes='))
+        with open(self.target_path, 'rb') as f:
+            self.assertEqual(f.read(), PDF_BODY)
+
+
+if __name__ == '__main__':
+    unittest.main()